@@ -0,0 +1,114 @@
+import asyncio
+import json
+from collections import deque
+from typing import Deque, Dict, Iterable
+
+"""
+Admission control: a per-process cap on requests being handled.
+
+A Limiter lets up to `limit` requests run at once. Later ones wait in a
+FIFO queue of at most `queue_size` entries for up to `queue_timeout`
+seconds; a request that finds the queue full, or is still waiting at the
+deadline, is refused. A finishing request hands its slot straight to the
+oldest waiter. Everything runs on the event loop thread, so plain counters
+suffice.
+
+AdmissionControl is the ASGI middleware around a Limiter: refused requests
+get an immediate 503 with Retry-After instead of adding to everyone's
+latency, and paths in `exempt` (health checks, metrics scrapes) bypass it.
+"""
+
+_BODY = json.dumps({"detail": "Server is overloaded, retry later"}).encode("utf-8")
+
+
+class Limiter:
+    def __init__(self, limit: int, queue_size: int = 0, queue_timeout: float = 0.1):
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.shed: Dict[str, int] = {"queue_full": 0, "timeout": 0}
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """Wait for a slot; False if the request should be shed."""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            self.shed["queue_full"] += 1
+            return False
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._waiters.append(fut)
+        timer = loop.call_later(self.queue_timeout, self._expire, fut)
+        try:
+            admitted = await fut
+        except asyncio.CancelledError:
+            # Client went away while queued; pass on a slot handed to us
+            if fut.done() and not fut.cancelled() and fut.result():
+                self.release()
+            else:
+                self._discard(fut)
+            raise
+        finally:
+            timer.cancel()
+        if not admitted:
+            self.shed["timeout"] += 1
+        return admitted
+
+    def _expire(self, fut: asyncio.Future) -> None:
+        if not fut.done():
+            self._discard(fut)
+            fut.set_result(False)
+
+    def _discard(self, fut: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            pass
+
+    def release(self) -> None:
+        # The slot passes to the oldest waiter, so in_flight stays the same
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(True)
+                return
+        self.in_flight -= 1
+
+
+class AdmissionControl:
+    def __init__(self, app, limiter: Limiter, retry_after: int = 1, exempt: Iterable[str] = ("/health",)):
+        self.app = app
+        self.limiter = limiter
+        self.retry_after = str(max(0, retry_after)).encode("latin-1")
+        self.exempt = frozenset(exempt)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            await self.app(scope, receive, send)
+            return
+        if not await self.limiter.acquire():
+            await self._reject(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release()
+
+    async def _reject(self, send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(_BODY)).encode("latin-1")),
+                (b"retry-after", self.retry_after),
+            ],
+        })
+        await send({"type": "http.response.body", "body": _BODY})
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+"""
+Bounded thread pool for blocking calls made from async endpoints.
+
+IOExecutor.run() hands a blocking function (file reads and reloads, lock
+waits, flushes) to a small dedicated pool so the event loop keeps serving
+other requests meanwhile. At most `max_pending` calls are queued or running;
+further callers wait on the event loop, so a slow disk produces
+backpressure instead of an unbounded backlog. With workers=0 calls run
+inline on the loop (the previous behaviour, kept for comparison).
+
+monitor_loop_lag() measures how late the loop wakes up from a fixed sleep,
+which is how long some callback held the loop.
+"""
+
+
+class IOExecutor:
+    def __init__(self, workers: int = 4, max_pending: int = 64):
+        self._workers = workers
+        self._max_pending = max(1, max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="io") if workers > 0 else None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        # asyncio primitives belong to one loop; Mangum runs a new loop per
+        # invocation, so the semaphore is recreated when the loop changes
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._sem_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def queued(self) -> int:
+        """Calls accepted but not yet started by a worker."""
+        return self._pending - self._running
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._sem_loop is not loop:
+            self._sem = asyncio.Semaphore(self._max_pending)
+            self._sem_loop = loop
+        return self._sem
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._pool is None:
+            return fn(*args)
+        async with self._semaphore():
+            with self._lock:
+                self._pending += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._pool, self._call, fn, args)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+
+    def _call(self, fn: Callable[..., Any], args: tuple) -> Any:
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+
+async def monitor_loop_lag(observe: Callable[[float], None], interval: float = 0.25) -> None:
+    """Report, every `interval`, how many seconds late the loop woke up."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        observe(max(0.0, time.perf_counter() - start - interval))
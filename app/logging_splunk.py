@@ -1,8 +1,15 @@
 import os
 import json
 import time
-import urllib.request
-from typing import Any, Dict, Optional
+import gzip
+import atexit
+import random
+import socket
+import threading
+import http.client
+from collections import deque
+from urllib.parse import urlsplit
+from typing import Any, Deque, Dict, List, Optional
 try:
   import boto3  # type: ignore
 except Exception:
@@ -14,10 +21,39 @@ Lightweight Splunk HEC helper for optional logging.
 Environment variables (set by Terraform on Lambda or locally):
   SPLUNK_HEC_URL     Base URL or /services/collector/event endpoint
   SPLUNK_HEC_TOKEN   HEC token (sensitive)
+  SPLUNK_HEC_SECRET_ARN / SPLUNK_HEC_SECRET_NAME
+                     Secrets Manager secret holding the token when
+                     SPLUNK_HEC_TOKEN is unset; re-read every SPLUNK_TOKEN_TTL_S
+                     seconds (default 300) in the background
   SPLUNK_INDEX       Optional index
   SPLUNK_SOURCE      Defaults to "fastapi"
   SPLUNK_SOURCETYPE  Defaults to "_json"
   SPLUNK_ENABLE      "1" (default) to enable, "0" to disable
+  SPLUNK_QUEUE_MAX   Events buffered before new ones are dropped (default 10000)
+  SPLUNK_BATCH_MAX   Events per HEC POST (default 100)
+  SPLUNK_FLUSH_MS    Max time an event waits for its batch to fill (default 1000)
+  SPLUNK_POOL_SIZE   Idle keep-alive connections kept to HEC (default 2, 0 disables reuse)
+  SPLUNK_GZIP        "1" to gzip request bodies
+  LOG_SINK           "hec" (default), "emf" or "both"
+  LOG_SAMPLE_RATE    Fraction of http_request events kept (default 1)
+  LOG_SAMPLE_RATES   Per-route overrides, e.g. "/health=0.001,/tasks/{task_id}=0.01"
+  LOG_SAMPLE_SLOW_MS Requests at least this slow are always kept (default 1000)
+  LOG_SAMPLE_TARGET_PER_MIN
+                     Optional cap on kept events per route per minute; rates
+                     adapt to the previous minute's traffic
+  EMF_NAMESPACE      CloudWatch namespace for EMF metrics (default "TodoApi")
+
+log_event() never does network I/O: events are queued in memory and a
+background thread ships them in batches, so request latency does not depend
+on Splunk. Call flush() to drain the queue (e.g. at shutdown).
+
+With LOG_SINK=emf each event is instead written to stdout as one CloudWatch
+Embedded Metric Format line, which CloudWatch Logs turns into metrics with
+no outbound call: http_request becomes latency_ms/requests by method, route
+and status (for every request: LOG_SAMPLE_* only thin HEC), and task writes
+become task_created/task_updated/task_deleted counts by the method, route
+and status the endpoint passes in props. The app emits http_request events
+whenever this sink is on, without ENABLE_SPLUNK_LOGGING.
 """
 
 _raw_url = (os.getenv("SPLUNK_HEC_URL", "").strip().rstrip("/"))
@@ -33,29 +69,58 @@ if _url:
     elif "/collector/" not in _url:
         _url = f"{_url}/services/collector/event"
 
-_enabled = os.getenv("SPLUNK_ENABLE", "1") == "1" and bool(_url)
+# Where log_event() writes: "hec" (default), "emf" (CloudWatch Embedded
+# Metric Format lines on stdout) or "both"
+_sink = os.getenv("LOG_SINK", "hec").strip().lower()
+_emf = _sink in ("emf", "both")
+_enabled = _sink in ("hec", "both") and os.getenv("SPLUNK_ENABLE", "1") == "1" and bool(_url)
 _index = os.getenv("SPLUNK_INDEX", "").strip() or None
 _source = os.getenv("SPLUNK_SOURCE", "fastapi")
 _sourcetype = os.getenv("SPLUNK_SOURCETYPE", "_json")
 
-_cached_token: Optional[str] = _token or None
-_last_fetch_ts: float = 0.0
-_TOKEN_TTL = 300.0  # seconds
+# Secrets Manager token: fetched in the background at import and refreshed
+# once older than _TOKEN_TTL. Callers keep getting the previous token while
+# a refresh is in flight, so nothing ever waits on Secrets Manager except
+# the shipper thread before the very first fetch has completed.
+_secret_id = _secret_arn or _secret_name
+_cached_token: Optional[str] = None
+_next_refresh_ts: float = float("-inf")  # monotonic
+_TOKEN_TTL = float(os.getenv("SPLUNK_TOKEN_TTL_S", "300"))  # seconds
+_TOKEN_RETRY = 30.0  # seconds between attempts after a failed fetch
+_token_lock = threading.Lock()
+_token_ready = threading.Event()
+_refreshing = False
+_secrets_client: Any = None
 
 def _get_token() -> Optional[str]:
-    global _cached_token, _last_fetch_ts
     # Prefer explicit token if provided
-    if _cached_token:
-        return _cached_token
+    if _token:
+        return _token
     # Fetch from Secrets Manager if configured
-    if not (_secret_arn or _secret_name) or boto3 is None:
+    if not _secret_id or boto3 is None:
         return None
-    now = time.time()
-    if _cached_token and (now - _last_fetch_ts) < _TOKEN_TTL:
-        return _cached_token
+    if time.monotonic() >= _next_refresh_ts:
+        _start_token_refresh()
+    if _cached_token is None:
+        _token_ready.wait(_POST_TIMEOUT)
+    return _cached_token
+
+def _start_token_refresh() -> None:
+    global _refreshing
+    with _token_lock:
+        if _refreshing:
+            return
+        _refreshing = True
+    threading.Thread(target=_refresh_token, name="splunk-token", daemon=True).start()
+
+def _refresh_token() -> None:
+    global _cached_token, _next_refresh_ts, _refreshing, _secrets_client
+    # Keep serving the previous token on failure; retried after _TOKEN_RETRY
+    next_refresh = time.monotonic() + _TOKEN_RETRY
     try:
-        client = boto3.client("secretsmanager")
-        resp = client.get_secret_value(SecretId=_secret_arn or _secret_name)
+        if _secrets_client is None:
+            _secrets_client = boto3.client("secretsmanager")
+        resp = _secrets_client.get_secret_value(SecretId=_secret_id)
         secret_string = resp.get("SecretString")
         # Accept either raw string or JSON object with hec_token key
         token = None
@@ -66,14 +131,129 @@ def _get_token() -> Optional[str]:
                 token = obj.get("hec_token") or obj.get("token") or secret_string
             except Exception:
                 pass
-        _cached_token = token
-        _last_fetch_ts = now
-        return _cached_token
+        if token:
+            _cached_token = token
+            next_refresh = time.monotonic() + _TOKEN_TTL
     except Exception:
-        return None
+        pass
+    finally:
+        with _token_lock:
+            _next_refresh_ts = next_refresh
+            _refreshing = False
+        _token_ready.set()
 
-def log_event(event_type: str, props: Optional[Dict[str, Any]] = None) -> None:
-    if not _enabled:
+_QUEUE_MAX = int(os.getenv("SPLUNK_QUEUE_MAX", "10000"))
+_BATCH_MAX = max(1, int(os.getenv("SPLUNK_BATCH_MAX", "100")))
+_FLUSH_INTERVAL = int(os.getenv("SPLUNK_FLUSH_MS", "1000")) / 1000.0
+_POST_TIMEOUT = 5.0
+_POOL_SIZE = int(os.getenv("SPLUNK_POOL_SIZE", "2"))
+_GZIP = os.getenv("SPLUNK_GZIP") == "1"
+_RETRIES = 3
+_RETRY_BACKOFF = 0.1  # seconds, doubled per attempt
+
+class _HecPool:
+    """Keep-alive HTTP(S) connections to one HEC endpoint.
+
+    A connection is reused until the server closes it; a post that fails
+    on a reused connection before any response (reset, closed between
+    batches) is retried on a fresh one with exponential backoff. 503 (HEC
+    queue full) is retried the same way. Other failures, timeouts in
+    particular, are not retried: HEC may already have the batch, and
+    sending it again would duplicate its events.
+    """
+
+    def __init__(self, url: str, size: int, timeout: float):
+        parts = urlsplit(url)
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname or ""
+        self._port = parts.port
+        self._path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self._size = size
+        self._timeout = timeout
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> http.client.HTTPConnection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        return cls(self._host, self._port, timeout=self._timeout)
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self._size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def forget(self) -> None:
+        # After fork the idle sockets are shared with the parent: drop them
+        # without closing so the parent's connections stay usable
+        self._idle = []
+
+    def post(self, body: bytes, headers: Dict[str, str]) -> bool:
+        for attempt in range(_RETRIES + 1):
+            if attempt:
+                time.sleep(_RETRY_BACKOFF * 2 ** (attempt - 1))
+            conn = self._acquire()
+            reused = conn.sock is not None
+            try:
+                if not reused:
+                    conn.connect()
+                    # http.client sends headers and body in separate writes;
+                    # without NODELAY a reused connection stalls on delayed ACKs
+                    conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                conn.request("POST", self._path, body=body, headers=headers)
+                resp = conn.getresponse()
+            except (ConnectionResetError, BrokenPipeError):
+                # RemoteDisconnected is a ConnectionResetError: the server
+                # closed an idle keep-alive connection
+                conn.close()
+                if reused:
+                    continue
+                return False
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                return False
+            try:
+                resp.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                return 200 <= resp.status < 300
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            if resp.status == 503:
+                continue
+            return 200 <= resp.status < 300
+        return False
+
+_pool = _HecPool(_url, _POOL_SIZE, _POST_TIMEOUT) if _url else None
+
+# Serialized events waiting for the shipper thread. _cond guards the queue,
+# the counters and _inflight (events taken by the worker but not yet sent).
+_queue: Deque[bytes] = deque()
+_cond = threading.Condition()
+_inflight = 0
+_flush_waiters = 0
+_worker: Optional[threading.Thread] = None
+_worker_pid: Optional[int] = None
+_sent = 0
+_dropped = 0
+_failed = 0
+
+def log_event(event_type: str, props: Optional[Dict[str, Any]] = None, hec: bool = True) -> None:
+    """Queue an event for HEC and/or write its EMF line; hec=False skips HEC."""
+    global _dropped
+    if _emf:
+        try:
+            _write_emf(event_type, props or {})
+        except Exception:
+            # Silent failure by design
+            pass
+    if not _enabled or not hec:
         return
     payload: Dict[str, Any] = {
         "time": int(time.time()),
@@ -84,14 +264,198 @@ def log_event(event_type: str, props: Optional[Dict[str, Any]] = None) -> None:
     if _index:
         payload["index"] = _index
     try:
-        token = _get_token()
-        if not token:
-            return
         data = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(_url, data=data, method="POST")
-        req.add_header("Authorization", f"Splunk {token}")
-        req.add_header("Content-Type", "application/json")
-        urllib.request.urlopen(req, timeout=1.0).read()
     except Exception:
         # Silent failure by design
-        pass
+        return
+    with _cond:
+        if len(_queue) >= _QUEUE_MAX:
+            _dropped += 1
+            return
+        _queue.append(data)
+        # Wake the worker to start a batch timer, or to send a full batch
+        if len(_queue) == 1 or len(_queue) >= _BATCH_MAX:
+            _cond.notify_all()
+    if _worker_pid != os.getpid():
+        _start_worker()
+
+_EMF_NAMESPACE = os.getenv("EMF_NAMESPACE", "TodoApi")
+_EMF_TASK_OPS = {"create": "task_created", "update": "task_updated", "delete": "task_deleted"}
+_emf_lock = threading.Lock()
+
+def emf_enabled() -> bool:
+    """True when LOG_SINK writes EMF lines (emf or both)."""
+    return _emf
+
+def _write_emf(event_type: str, props: Dict[str, Any]) -> None:
+    rec: Dict[str, Any] = {"type": event_type, **props}
+    dims: List[str] = []
+    metrics: List[Dict[str, str]] = []
+    if event_type == "http_request":
+        # Dimension values must be strings; the route template keeps
+        # /tasks/{task_id} as one series rather than one per id, and
+        # unmatched paths share one series too
+        rec["route"] = str(props.get("route") or "unmatched")
+        rec["method"] = str(props.get("method"))
+        rec["status"] = str(props.get("status"))
+        # EMF gets every request (sampling only thins HEC), so each line
+        # counts once and latency statistics are not skewed towards the
+        # always-kept slow and 5xx requests
+        rec.pop("sample_weight", None)
+        rec["requests"] = 1
+        dims = ["method", "route", "status"]
+        metrics = [{"Name": "latency_ms", "Unit": "Milliseconds"}, {"Name": "requests", "Unit": "Count"}]
+    elif event_type in _EMF_TASK_OPS.values() or (event_type == "tasks_batch" and props.get("op") in _EMF_TASK_OPS):
+        # Write counts under the method/route/status the endpoint passed
+        if event_type == "tasks_batch":
+            name, count = _EMF_TASK_OPS[props["op"]], props.get("applied", 0)
+        else:
+            name, count = event_type, 1
+        for key in ("method", "route", "status"):
+            rec[key] = str(props.get(key))
+        rec[name] = count
+        dims = ["method", "route", "status"]
+        metrics = [{"Name": name, "Unit": "Count"}]
+    if metrics:
+        rec["_aws"] = {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{"Namespace": _EMF_NAMESPACE, "Dimensions": [dims], "Metrics": metrics}],
+        }
+    data = (json.dumps(rec, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+    # One write per line so concurrent events never interleave
+    with _emf_lock:
+        while data:
+            data = data[os.write(1, data):]
+
+def _parse_rates(raw: str) -> Dict[str, float]:
+    rates: Dict[str, float] = {}
+    for part in raw.split(","):
+        key, sep, value = part.strip().rpartition("=")
+        if sep and key:
+            rates[key.strip()] = min(1.0, max(0.0, float(value)))
+    return rates
+
+_SAMPLE_RATE = min(1.0, max(0.0, float(os.getenv("LOG_SAMPLE_RATE", "1"))))
+_SAMPLE_RATES = _parse_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+_SAMPLE_SLOW_MS = float(os.getenv("LOG_SAMPLE_SLOW_MS", "1000"))
+_SAMPLE_TARGET = float(os.getenv("LOG_SAMPLE_TARGET_PER_MIN", "0"))
+_SAMPLE_WINDOW = 60.0
+# Adaptive mode: requests seen per route in the current window, and the
+# rate cap each route got from the previous one
+_sample_seen: Dict[str, int] = {}
+_sample_caps: Dict[str, float] = {}
+_sample_window_end = 0.0
+
+def sample_weight(route: str, status: int, latency_ms: float) -> Optional[float]:
+    """Head-sampling decision for one http_request event.
+
+    Returns None to skip the event, otherwise the weight to ship with it
+    (1 / the rate it was sampled at). Server errors and slow requests are
+    always kept with weight 1, so sum(sample_weight) estimates true counts.
+    """
+    if status >= 500 or latency_ms >= _SAMPLE_SLOW_MS:
+        return 1.0
+    rate = _SAMPLE_RATES.get(route, _SAMPLE_RATE)
+    if _SAMPLE_TARGET > 0:
+        rate = min(rate, _adaptive_cap(route))
+    if rate >= 1.0:
+        return 1.0
+    if random.random() >= rate:
+        return None
+    return 1.0 / rate
+
+def _adaptive_cap(route: str) -> float:
+    global _sample_seen, _sample_caps, _sample_window_end
+    now = time.monotonic()
+    if now >= _sample_window_end:
+        _sample_caps = {k: min(1.0, _SAMPLE_TARGET / n) for k, n in _sample_seen.items()}
+        _sample_seen = {}
+        _sample_window_end = now + _SAMPLE_WINDOW
+    _sample_seen[route] = _sample_seen.get(route, 0) + 1
+    return _sample_caps.get(route, 1.0)
+
+def flush(timeout: float = 2.0) -> bool:
+    """Ship everything queued so far. Returns False if the deadline passed first."""
+    global _flush_waiters
+    if not _enabled:
+        return True
+    if _queue and _worker_pid != os.getpid():
+        _start_worker()
+    deadline = time.monotonic() + timeout
+    with _cond:
+        _flush_waiters += 1
+        _cond.notify_all()
+        try:
+            while _queue or _inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                _cond.wait(remaining)
+            return True
+        finally:
+            _flush_waiters -= 1
+
+def stats() -> Dict[str, int]:
+    """Shipper counters for this process."""
+    with _cond:
+        return {"queued": len(_queue) + _inflight, "sent": _sent, "dropped": _dropped, "failed": _failed}
+
+def _start_worker() -> None:
+    global _worker, _worker_pid
+    with _cond:
+        # Threads do not survive fork; a child process starts its own
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+        if _pool is not None:
+            _pool.forget()
+        _worker = threading.Thread(target=_ship_loop, name="splunk-hec", daemon=True)
+        _worker.start()
+
+def _ship_loop() -> None:
+    global _inflight, _sent, _failed
+    while True:
+        with _cond:
+            while not _queue:
+                _cond.wait()
+            # Give the batch up to _FLUSH_INTERVAL to fill unless someone
+            # is waiting in flush()
+            deadline = time.monotonic() + _FLUSH_INTERVAL
+            while len(_queue) < _BATCH_MAX and not _flush_waiters:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                _cond.wait(remaining)
+            batch = [_queue.popleft() for _ in range(min(len(_queue), _BATCH_MAX))]
+            _inflight = len(batch)
+        ok = _post(batch)
+        with _cond:
+            _inflight = 0
+            if ok:
+                _sent += len(batch)
+            else:
+                _failed += len(batch)
+            _cond.notify_all()
+
+def _post(batch: List[bytes]) -> bool:
+    # HEC accepts several event objects concatenated in one body
+    try:
+        token = _get_token()
+        if not token or _pool is None:
+            return False
+        body = b"\n".join(batch)
+        headers = {"Authorization": f"Splunk {token}", "Content-Type": "application/json"}
+        if _GZIP:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return _pool.post(body, headers)
+    except Exception:
+        # Silent failure by design
+        return False
+
+if _enabled and not _token and _secret_id and boto3 is not None:
+    _start_token_refresh()
+
+# Best effort for plain process exit; servers should call flush() from
+# their shutdown hook as well
+atexit.register(flush)
@@ -1,12 +1,15 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import os
+import asyncio
 import time
 import sys
 import json
 from pathlib import Path
 import threading
+from typing import Literal, Optional
 # Optional rate limiting (fastapi-limiter + Redis). Falls back to no-op if
 # the package or REDIS_URL are not configured so Lambda still runs.
 try:
@@ -16,32 +19,95 @@ try:
     _limiter_available = True
 except Exception:
     _limiter_available = False
-    def _RateLimiter(*_args, **_kwargs):  # no-op dependency
-        async def _noop():
-            return None
-        return _noop
-RateLimiter = _RateLimiter
+
+def _noop_rate_limiter(*_args, **_kwargs):  # no-op dependency
+    async def _noop():
+        return None
+    return _noop
+
+def _timed_rate_limiter(**kwargs):
+    # fastapi-limiter dependency, timed as the "ratelimit" Server-Timing phase
+    limiter = _RateLimiter(**kwargs)
+    async def _limit(request: Request, response: Response):
+        with phase("ratelimit"):
+            await limiter(request, response)
+    return _limit
+
+RateLimiter = _timed_rate_limiter if (_limiter_available and os.getenv("REDIS_URL")) else _noop_rate_limiter
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Boolean, select, delete as sql_delete
-from fastapi_limiter.depends import RateLimiter
+from sqlalchemy import String, Boolean, case, select, delete as sql_delete, update as sql_update, event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 try:
-    from .logging_splunk import log_event  # when executed as app.main
+    from .logging_splunk import log_event, flush as flush_logs, sample_weight, stats as log_stats, emf_enabled  # when executed as app.main
 except Exception:
     # Fallback for local runs executed as a script
-    from logging_splunk import log_event  # type: ignore
+    from logging_splunk import log_event, flush as flush_logs, sample_weight, stats as log_stats, emf_enabled  # type: ignore
+try:
+    from .task_store import HAVE_FLOCK, FileTaskStore, fsync_dir, stat_key
+except Exception:
+    from task_store import HAVE_FLOCK, FileTaskStore, fsync_dir, stat_key  # type: ignore
+try:
+    from .metrics import Counter, Gauge, Histogram, Registry, RequestMetrics, method_label
+except Exception:
+    from metrics import Counter, Gauge, Histogram, Registry, RequestMetrics, method_label  # type: ignore
+try:
+    from .io_executor import IOExecutor, monitor_loop_lag
+except Exception:
+    from io_executor import IOExecutor, monitor_loop_lag  # type: ignore
+try:
+    from .admission import AdmissionControl, Limiter
+except Exception:
+    from admission import AdmissionControl, Limiter  # type: ignore
+try:
+    from .singleflight import SingleFlight
+except Exception:
+    from singleflight import SingleFlight  # type: ignore
+try:
+    from .response_cache import ResponseCache, etag_matches
+except Exception:
+    from response_cache import ResponseCache, etag_matches  # type: ignore
+try:
+    from . import timing
+    from .timing import TimedRoute, phase
+except Exception:
+    import timing  # type: ignore
+    from timing import TimedRoute, phase  # type: ignore
 
-# --- Database (Supabase Postgres) ---
-DATABASE_URL = os.getenv("DATABASE_URL")  # e.g., postgresql://... from Supabase
+# --- Database (Supabase Postgres or embedded SQLite) ---
+# e.g., postgresql://... from Supabase, or sqlite:////data/tasks.db for a
+# single-node deployment without a network hop
+DATABASE_URL = os.getenv("DATABASE_URL")
 engine = None
 SessionLocal = None
 
 if DATABASE_URL:
-    # Use async driver
-    ASYNC_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
-    engine = create_async_engine(ASYNC_URL, pool_pre_ping=True)
+    if DATABASE_URL.startswith("sqlite"):
+        ASYNC_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+        engine = create_async_engine(ASYNC_URL)
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _record):
+            # WAL lets readers run alongside the single writer; NORMAL sync
+            # is durable across app crashes and only fsyncs at checkpoints.
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.execute("PRAGMA busy_timeout=5000")
+            cur.close()
+    else:
+        # Use async driver
+        ASYNC_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
+        engine = create_async_engine(ASYNC_URL, pool_pre_ping=True)
     SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+def _insert(model):
+    # INSERT ... ON CONFLICT is dialect-specific; both dialects support RETURNING
+    if engine is not None and engine.dialect.name == "sqlite":
+        return sqlite_insert(model)
+    return pg_insert(model)
+
 class Base(DeclarativeBase):
     pass
 
@@ -49,11 +115,37 @@ class TaskORM(Base):
     __tablename__ = "todos"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String, nullable=False)
-    completed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    completed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False, index=True)
 
 # Create a FastAPI app instance
 app = FastAPI()
 
+# SERVER_TIMING=1 adds a Server-Timing header (ratelimit, db_acquire, query,
+# serialize, log and total, in ms) to every response and the same phases
+# to the http_request log event. Must be set before routes are declared.
+_SERVER_TIMING = os.getenv("SERVER_TIMING") == "1"
+if _SERVER_TIMING:
+    app.router.route_class = TimedRoute
+
+# Admission control (ADMISSION_MAX_IN_FLIGHT > 0): at most that many
+# requests per process are handled at once; up to ADMISSION_QUEUE more wait
+# ADMISSION_QUEUE_MS for a slot, the rest get a fast 503 with Retry-After.
+# Added before CORS so rejections still carry CORS headers.
+_ADMISSION_LIMIT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "0"))
+_admission = None
+if _ADMISSION_LIMIT > 0:
+    _admission = Limiter(
+        _ADMISSION_LIMIT,
+        int(os.getenv("ADMISSION_QUEUE", str(_ADMISSION_LIMIT))),
+        float(os.getenv("ADMISSION_QUEUE_MS", "100")) / 1000.0,
+    )
+    app.add_middleware(
+        AdmissionControl,
+        limiter=_admission,
+        retry_after=int(os.getenv("ADMISSION_RETRY_AFTER_S", "1")),
+        exempt=("/health", "/metrics"),
+    )
+
 # Allow the frontend to call this API (CORS)
 # In production, set ALLOW_ORIGINS to a comma-separated list (e.g.,
 # "https://dxxxx.cloudfront.net,https://mydomain.com").
@@ -71,27 +163,154 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
-@app.middleware("http")
-async def request_logger(request, call_next):
-  start = time.perf_counter()
-  response = await call_next(request)
-  try:
-    if os.getenv("ENABLE_SPLUNK_LOGGING") == "1":
-      client_ip = request.headers.get("x-forwarded-for", request.client.host if getattr(request, "client", None) else None)
-      log_event("http_request", {
-        "method": request.method,
-        "path": request.url.path,
-        "status": response.status_code,
-        "user_agent": request.headers.get("user-agent"),
-        "client_ip": client_ip,
-        "latency_ms": round((time.perf_counter() - start) * 1000, 2),
-      })
-  except Exception as e:
-    if os.getenv("DEBUG"):
-      print(f"Splunk log failed (request): {e}", file=sys.stderr)
-  return response
+# Rolled-up request metrics (REQUEST_METRICS=1): one summary event per
+# method/route/status class per interval instead of one per request
+_request_metrics = (
+    RequestMetrics(log_event, float(os.getenv("REQUEST_METRICS_INTERVAL_S", "60")))
+    if os.getenv("REQUEST_METRICS") == "1" else None
+)
+
+# Prometheus metrics (ENABLE_PROMETHEUS=1), served at /metrics. Under
+# `uvicorn --workers N` set PROMETHEUS_MULTIPROC_DIR to an empty directory
+# so every worker's scrape covers all of them.
+_PROMETHEUS = os.getenv("ENABLE_PROMETHEUS") == "1"
+_registry = Registry(os.getenv("PROMETHEUS_MULTIPROC_DIR") or None)
+_http_latency = Histogram(_registry, "http_request_duration_seconds", "Request latency by route template", ("method", "route", "status"))
+_http_in_flight = Gauge(_registry, "http_requests_in_flight", "Requests currently being handled")
+
+def _db_pool_stats():
+    pool = engine.pool if engine is not None else None
+    stats = {}
+    for state, attr in (("size", "size"), ("checked_out", "checkedout"), ("checked_in", "checkedin"), ("overflow", "overflow")):
+        fn = getattr(pool, attr, None)
+        if fn is not None:
+            stats[(state,)] = fn()
+    return stats
+
+def _task_file_sizes():
+    if engine is not None:
+        return {}
+    sizes = {}
+    for kind, path in (("snapshot", TASKS_FILE), ("journal", _TASKS_JOURNAL)):
+        key = stat_key(path) if path is not None else None
+        if key is not None:
+            sizes[(kind,)] = key[2]
+    return sizes
+
+Gauge(_registry, "db_pool_connections", "SQLAlchemy pool connections by state", ("state",), collect=_db_pool_stats)
+_db_checkouts = Counter(_registry, "db_pool_checkouts_total", "Connections checked out of the SQLAlchemy pool")
+_file_load_seconds = Histogram(_registry, "task_file_load_seconds", "Time spent loading TASKS_FILE")
+_file_save_seconds = Histogram(_registry, "task_file_save_seconds", "Time spent writing TASKS_FILE snapshots")
+Gauge(_registry, "task_file_bytes", "Size of the task snapshot and journal files", ("file",), collect=_task_file_sizes, mode="max")
+Counter(_registry, "log_events_total", "Events handled by the HEC shipper by outcome", ("outcome",),
+        collect=lambda: {(k,): v for k, v in log_stats().items() if k != "queued"})
+Gauge(_registry, "log_events_queued", "Events waiting to be shipped to HEC", collect=lambda: {(): log_stats()["queued"]})
+
+if _admission is not None:
+    Gauge(_registry, "http_admission_in_flight", "Requests holding an admission slot", collect=lambda: {(): _admission.in_flight})
+    Gauge(_registry, "http_admission_queued", "Requests waiting for an admission slot", collect=lambda: {(): _admission.queued})
+    Counter(_registry, "http_requests_shed_total", "Requests refused with 503 by admission control", ("reason",),
+            collect=lambda: {(reason,): n for reason, n in _admission.shed.items()})
+
+if engine is not None:
+    @event.listens_for(engine.sync_engine, "checkout")
+    def _count_checkout(*_args):
+        _db_checkouts.inc()
+
+class RequestLogger:
+    """Per-request metrics, Server-Timing header and http_request log event.
+
+    Plain ASGI middleware: the status comes from http.response.start, the
+    latency runs until the last body chunk is sent, and the route template
+    is read from scope["route"], which the router sets on the shared scope.
+    Config is read once, when Starlette builds the middleware stack.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # http_request events feed Splunk (ENABLE_SPLUNK_LOGGING=1) and the
+        # EMF request metrics (LOG_SINK=emf|both)
+        self.log_requests = os.getenv("ENABLE_SPLUNK_LOGGING") == "1" or emf_enabled()
+        self.server_timing = _SERVER_TIMING
+        self.prometheus = _PROMETHEUS
+        self.request_metrics = _request_metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        timings = timing.start() if self.server_timing else None
+        status = 500  # if the app raises before starting a response
+        end = None
+
+        async def send_wrapper(message):
+            nonlocal status, end
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings is not None:
+                    header = timings.header(total=time.perf_counter() - start)
+                    message = {**message, "headers": [
+                        *message.get("headers", ()),
+                        (b"server-timing", header.encode("latin-1")),
+                        (b"timing-allow-origin", b"*"),
+                    ]}
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                end = time.perf_counter()
+
+        if self.prometheus:
+            _http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if self.prometheus:
+                _http_in_flight.dec()
+            try:
+                self._record(scope, status, timings, (end or time.perf_counter()) - start)
+            except Exception as e:
+                if os.getenv("DEBUG"):
+                    print(f"Splunk log failed (request): {e}", file=sys.stderr)
+
+    def _record(self, scope, status, timings, elapsed):
+        latency_ms = round(elapsed * 1000, 2)
+        method = scope["method"]
+        route = getattr(scope.get("route"), "path", None)
+        if self.prometheus:
+            _http_latency.observe(elapsed, method=method_label(method), route=route or "unmatched", status=status)
+        if self.request_metrics is not None:
+            self.request_metrics.record(method, route, status, latency_ms)
+        if not self.log_requests:
+            return
+        # Sampling only thins the HEC stream; EMF lines are written for every
+        # request so CloudWatch latency statistics stay unbiased
+        weight = sample_weight(route or scope["path"], status, latency_ms)
+        if weight is None and not emf_enabled():
+            return
+        user_agent = forwarded_for = None
+        for key, value in scope["headers"]:
+            if key == b"user-agent":
+                user_agent = value.decode("latin-1")
+            elif key == b"x-forwarded-for":
+                forwarded_for = value.decode("latin-1")
+        client = scope.get("client")
+        log_event("http_request", {
+            "method": method,
+            "path": scope["path"],
+            "route": route,
+            "status": status,
+            "user_agent": user_agent,
+            "client_ip": forwarded_for or (client[0] if client else None),
+            "latency_ms": latency_ms,
+            "sample_weight": weight,
+            **({"timings_ms": timings.as_ms()} if timings is not None else {}),
+        }, hec=weight is not None)
+
+# Added last so it wraps CORS and sees every response
+app.add_middleware(RequestLogger)
 
 # Optional AWS Lambda handler (active in Lambda or when ENABLE_MANGUM=1)
 try:
@@ -100,9 +319,31 @@ try:
 except Exception:
     _has_mangum = False
 
-if _has_mangum and (os.getenv("AWS_LAMBDA_FUNCTION_NAME") or os.getenv("ENABLE_MANGUM") == "1"):
+_SPLUNK_FLUSH_TIMEOUT = float(os.getenv("SPLUNK_FLUSH_TIMEOUT_S", "2"))
+_LAMBDA_HANDLER = _has_mangum and bool(os.getenv("AWS_LAMBDA_FUNCTION_NAME") or os.getenv("ENABLE_MANGUM") == "1")
+
+if _LAMBDA_HANDLER:
+    _mangum = Mangum(app)
+    # Queued Splunk events are flushed every N invocations (1 = after each).
+    # The shipper thread is frozen with the sandbox between invocations, so
+    # events still queued are only lost if the sandbox is reclaimed first.
+    _LOG_FLUSH_EVERY = max(1, int(os.getenv("SPLUNK_FLUSH_EVERY", "1")))
+    _invocations = 0
+
     # Expose `handler` for AWS Lambda runtime
-    handler = Mangum(app)
+    def handler(event, context):
+        global _invocations
+        try:
+            return _mangum(event, context)
+        finally:
+            _invocations += 1
+            if _invocations % _LOG_FLUSH_EVERY == 0:
+                timeout = _SPLUNK_FLUSH_TIMEOUT
+                remaining = getattr(context, "get_remaining_time_in_millis", None)
+                if remaining is not None:
+                    # Keep headroom to return the response before the function times out
+                    timeout = min(timeout, max(0.0, remaining() / 1000.0 - 0.5))
+                flush_logs(timeout=timeout)
 
 
 # Define a health check endpoint that returns service status
@@ -110,6 +351,11 @@ if _has_mangum and (os.getenv("AWS_LAMBDA_FUNCTION_NAME") or os.getenv("ENABLE_M
 def health_check():
     return {"status": "ok"}
 
+if _PROMETHEUS:
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        return Response(_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Define a Task model using Pydantic BaseModel
 class Task(BaseModel):
     id: int
@@ -119,22 +365,94 @@ class Task(BaseModel):
 # --- File-based fallback storage (no DB) -----------------------------------
 TASKS_FILE = Path(os.getenv("TASKS_FILE", "/tmp/tasks.json"))
 _lock = threading.Lock()
+# Last parsed file contents keyed on (st_ino, st_mtime_ns, st_size). Each
+# worker process holds its own copy; a replace by any process changes the
+# inode and mtime, so a stale entry is never served. Callers must not
+# mutate the returned list.
+_load_cache: Optional[tuple] = None
 
 def _file_load_tasks() -> list[Task]:
-    if not TASKS_FILE.exists():
+    global _load_cache
+    key = stat_key(TASKS_FILE)
+    if key is None:
         return []
+    cached = _load_cache
+    if cached is not None and cached[0] == key:
+        return cached[1]
     try:
         raw = json.loads(TASKS_FILE.read_text("utf-8"))
-        return [Task(**item) for item in raw] if isinstance(raw, list) else []
+        tasks = [Task(**item) for item in raw] if isinstance(raw, list) else []
     except Exception:
         return []
+    # Only trust the parse if the file did not change underneath us
+    if stat_key(TASKS_FILE) == key:
+        _load_cache = (key, tasks)
+    return tasks
 
-def _file_save_tasks(tasks: list[Task]) -> None:
+def _file_save_tasks(tasks: list[Task], fsync: bool = True) -> None:
+    global _load_cache
     data = [t.model_dump() for t in tasks]
     tmp = TASKS_FILE.with_suffix(".tmp")
     with _lock:
-        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        with tmp.open("w", encoding="utf-8") as f:
+            f.write(json.dumps(data, ensure_ascii=False, indent=2))
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
         tmp.replace(TASKS_FILE)
+        if fsync:
+            fsync_dir(TASKS_FILE)
+        # What we just wrote is what the next load would parse
+        _load_cache = (stat_key(TASKS_FILE), list(tasks))
+
+# Resident copy of the task file: loaded once, reads served from memory and
+# writes group-committed by a background flusher. With TASKS_JOURNAL=1
+# writes append to TASKS_FILE's .journal and are compacted into the snapshot
+# once the journal grows past TASKS_JOURNAL_MAX_KB. TASKS_DURABILITY picks
+# when data is fsynced: none, interval (every TASKS_FSYNC_INTERVAL_MS) or
+# always (before the response is sent). TASKS_SHARED (on by default where
+# flock exists) lets several worker processes use the same TASKS_FILE;
+# TASKS_SHARED=0 saves the lock and stat per write for a single process.
+_TASKS_FLUSH_DELAY = float(os.getenv("TASKS_FLUSH_DELAY_MS", "2")) / 1000.0
+_TASKS_JOURNAL = TASKS_FILE.with_suffix(".journal") if os.getenv("TASKS_JOURNAL") == "1" else None
+_TASKS_JOURNAL_MAX_BYTES = int(os.getenv("TASKS_JOURNAL_MAX_KB", "1024")) * 1024
+_TASKS_DURABILITY = os.getenv("TASKS_DURABILITY", "always")
+_TASKS_FSYNC_INTERVAL = float(os.getenv("TASKS_FSYNC_INTERVAL_MS", "1000")) / 1000.0
+def _timed(fn, hist):
+    def wrapper(*args, **kwargs):
+        with hist.time():
+            return fn(*args, **kwargs)
+    return wrapper
+
+# Blocking store calls (loads, shared-mode reloads, flushes) run on a small
+# bounded pool instead of the event loop: IO_WORKERS threads (0 = inline),
+# at most IO_MAX_PENDING calls queued or running.
+_io = IOExecutor(int(os.getenv("IO_WORKERS", "4")), int(os.getenv("IO_MAX_PENDING", "64")))
+Gauge(_registry, "io_executor_queued", "Blocking calls waiting for an I/O thread", collect=lambda: {(): _io.queued})
+Gauge(_registry, "io_executor_running", "Blocking calls running on I/O threads", collect=lambda: {(): _io.running})
+_loop_lag = Histogram(_registry, "event_loop_lag_seconds", "How late the event loop woke from a 250ms sleep",
+                      buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+async def _store(fn, *args, write: bool = False):
+    # Reads and queued writes are in-memory once the store is fresh; only a
+    # (re)load touches the disk, and that goes to the I/O pool. Shared-mode
+    # writes wait on the flock, so they always go to the pool.
+    if _task_store.is_fresh(write):
+        return fn(*args)
+    return await _io.run(fn, *args)
+
+_task_store = FileTaskStore(
+    TASKS_FILE,
+    _timed(_file_load_tasks, _file_load_seconds),
+    _timed(_file_save_tasks, _file_save_seconds),
+    flush_delay=_TASKS_FLUSH_DELAY,
+    journal=_TASKS_JOURNAL,
+    model=Task,
+    compact_bytes=_TASKS_JOURNAL_MAX_BYTES,
+    durability=_TASKS_DURABILITY,
+    fsync_interval=_TASKS_FSYNC_INTERVAL,
+    shared=os.getenv("TASKS_SHARED", "1" if HAVE_FLOCK else "0") == "1",
+)
 
 @app.on_event("startup")
 async def _load_on_startup():
@@ -149,119 +467,498 @@ async def _load_on_startup():
     if engine is not None:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+    else:
+        await _io.run(_task_store.ensure_loaded)
+    if _PROMETHEUS:
+        _registry.start_sync()
+    # Lambda rolls metrics over lazily on the next request instead, and
+    # skips the lag monitor; timers would be frozen between invocations
+    global _metrics_ticker, _lag_monitor
+    if _request_metrics is not None and not _LAMBDA_HANDLER and _metrics_ticker is None:
+        _metrics_ticker = asyncio.create_task(_tick_request_metrics())
+    if _PROMETHEUS and not _LAMBDA_HANDLER and _lag_monitor is None:
+        _lag_monitor = asyncio.create_task(monitor_loop_lag(_loop_lag.observe))
+
+_metrics_ticker: Optional[asyncio.Task] = None
+_lag_monitor: Optional[asyncio.Task] = None
+
+async def _tick_request_metrics():
+    while True:
+        await asyncio.sleep(1.0)
+        try:
+            _request_metrics.flush_due()
+        except Exception as e:
+            if os.getenv("DEBUG"):
+                print(f"Request metrics flush failed: {e}", file=sys.stderr)
+
+@app.on_event("shutdown")
+async def _flush_on_shutdown():
+    # Under Mangum this runs after every invocation, so pending writes reach
+    # /tmp before the sandbox is frozen. Log events are flushed by `handler`
+    # there, on its own schedule.
+    if engine is None:
+        await _io.run(_task_store.flush)
+        await _io.run(_task_store.sync)
+    if not _LAMBDA_HANDLER:
+        if _request_metrics is not None:
+            _request_metrics.flush()
+        await _io.run(flush_logs, _SPLUNK_FLUSH_TIMEOUT)
 
 async def get_db():
     if SessionLocal is None:
-        raise HTTPException(status_code=500, detail="DATABASE_URL not configured")
+        # File-backed mode: endpoints use the resident task store instead
+        yield None
+        return
     async with SessionLocal() as session:
+        # Check the connection out up front so pool waits are attributed
+        # to db_acquire rather than to the first query
+        with phase("db_acquire"):
+            await session.connection()
         yield session
 
+def _endpoint_dims(request: Request) -> dict:
+    # method/route/status of the endpoint logging a write event, so EMF task
+    # counts share the http_request dimensions; events are only logged
+    # after a successful write, i.e. with the route's own status code
+    route = request.scope.get("route")
+    return {"method": request.method, "route": getattr(route, "path", None),
+            "status": getattr(route, "status_code", None) or 200}
+
 # Create a task
 @app.post("/tasks/", response_model=Task, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-async def create_task(task: Task, db: AsyncSession = Depends(get_db) if SessionLocal else None):
-    if SessionLocal is None:
-        # File-backed mode
-        items = _file_load_tasks()
-        if any(t.id == task.id for t in items):
-            raise HTTPException(status_code=400, detail="Task with this ID already exists")
-        items.append(task)
-        _file_save_tasks(items)
-    else:
-        # DB-backed mode
-        # Ensure unique id if client provides one
-        result = await db.execute(select(TaskORM).where(TaskORM.id == task.id))
-        if result.scalar_one_or_none() is not None:
-            raise HTTPException(status_code=400, detail="Task with this ID already exists")
-        db_obj = TaskORM(id=task.id, title=task.title, completed=task.completed)
-        db.add(db_obj)
-        await db.commit()
-    try:
-        log_event("task_created", {"id": task.id, "title": task.title, "completed": task.completed})
-    except Exception as e:
-        if os.getenv("DEBUG"):
-            print(f"Splunk log failed (create): {e}", file=sys.stderr)
+async def create_task(request: Request, task: Task, db: Optional[AsyncSession] = Depends(get_db)):
+    with phase("query"):
+        if SessionLocal is None:
+            # File-backed mode
+            commit = await _store(_task_store.create, task, write=True)
+            # False: another worker committed the same id first (TASKS_SHARED)
+            if commit is None or not await asyncio.wrap_future(commit):
+                raise HTTPException(status_code=400, detail="Task with this ID already exists")
+        else:
+            # DB-backed mode: one INSERT ... ON CONFLICT DO NOTHING RETURNING;
+            # no row back means the client-provided id is taken
+            result = await db.execute(
+                _insert(TaskORM)
+                .values(id=task.id, title=task.title, completed=task.completed)
+                .on_conflict_do_nothing(index_elements=[TaskORM.id])
+                .returning(TaskORM.id)
+            )
+            if result.scalar_one_or_none() is None:
+                raise HTTPException(status_code=400, detail="Task with this ID already exists")
+            await db.commit()
+    _invalidate_reads()
+    with phase("log"):
+        try:
+            log_event("task_created", {"id": task.id, "title": task.title, "completed": task.completed,
+                                       **_endpoint_dims(request)})
+        except Exception as e:
+            if os.getenv("DEBUG"):
+                print(f"Splunk log failed (create): {e}", file=sys.stderr)
     return task
 
-# Get all tasks
-@app.get("/tasks/", response_model=list[Task])
-async def get_tasks(db: AsyncSession = Depends(get_db) if SessionLocal else None):
+# --- Bulk endpoints ---------------------------------------------------------
+# Each batch is one rate-limiter hit, one transaction (or one store flush) and
+# one log event. Items succeed or fail individually; the response lists a
+# status per item in request order. Registered before /tasks/{task_id} so
+# "batch" is not parsed as an id.
+_BATCH_MAX = 1000
+
+class BatchItemResult(BaseModel):
+    id: int
+    status: int
+    detail: Optional[str] = None
+
+def _batch_results(ids: list[int], oks: list[bool], status: int, fail_status: int, fail_detail: str) -> list[BatchItemResult]:
+    return [
+        BatchItemResult(id=i, status=status) if ok else BatchItemResult(id=i, status=fail_status, detail=fail_detail)
+        for i, ok in zip(ids, oks)
+    ]
+
+async def _file_batch(op: str, args: list) -> list[bool]:
+    oks, commit = await _store(_task_store.apply_batch, [(op, a) for a in args], write=True)
+    if commit is not None:
+        # Final flags: items that lost to another worker's write are False
+        oks = await asyncio.wrap_future(commit)
+    return oks
+
+def _log_batch(request: Request, op: str, results: list[BatchItemResult]) -> None:
+    with phase("log"):
+        try:
+            applied = sum(1 for r in results if r.status < 400)
+            log_event("tasks_batch", {"op": op, "requested": len(results), "applied": applied,
+                                      **_endpoint_dims(request)})
+        except Exception as e:
+            if os.getenv("DEBUG"):
+                print(f"Splunk log failed (batch {op}): {e}", file=sys.stderr)
+
+@app.post("/tasks/batch", response_model=list[BatchItemResult], dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def create_tasks(
+    request: Request,
+    tasks: list[Task] = Body(..., max_length=_BATCH_MAX),
+    db: Optional[AsyncSession] = Depends(get_db),
+):
+    ids = [t.id for t in tasks]
+    with phase("query"):
+        if SessionLocal is None:
+            oks = await _file_batch("create", tasks)
+        else:
+            # One multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING; repeats
+            # of an id within the batch are rejected like existing ids
+            first: dict[int, Task] = {}
+            for t in tasks:
+                first.setdefault(t.id, t)
+            inserted = set()
+            if first:
+                result = await db.execute(
+                    _insert(TaskORM)
+                    .values([{"id": t.id, "title": t.title, "completed": t.completed} for t in first.values()])
+                    .on_conflict_do_nothing(index_elements=[TaskORM.id])
+                    .returning(TaskORM.id)
+                )
+                inserted = set(result.scalars())
+                await db.commit()
+            oks = [t.id in inserted and first[t.id] is t for t in tasks]
+    results = _batch_results(ids, oks, 201, 400, "Task with this ID already exists")
+    if any(oks):
+        _invalidate_reads()
+    _log_batch(request, "create", results)
+    return results
+
+@app.put("/tasks/batch", response_model=list[BatchItemResult], dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def update_tasks(
+    request: Request,
+    tasks: list[Task] = Body(..., max_length=_BATCH_MAX),
+    db: Optional[AsyncSession] = Depends(get_db),
+):
+    ids = [t.id for t in tasks]
+    with phase("query"):
+        if SessionLocal is None:
+            oks = await _file_batch("update", tasks)
+        else:
+            # One UPDATE ... SET col = CASE id WHEN ... END WHERE id IN (...)
+            # RETURNING id: statuses come from the rows actually updated, so
+            # a row deleted concurrently is a 404, not a failed batch. A
+            # repeated id takes its last value, as sequential updates would.
+            last = {t.id: t for t in tasks}
+            updated = set()
+            if last:
+                result = await db.execute(
+                    sql_update(TaskORM)
+                    .where(TaskORM.id.in_(last))
+                    .values(
+                        title=case({i: t.title for i, t in last.items()}, value=TaskORM.id),
+                        completed=case({i: t.completed for i, t in last.items()}, value=TaskORM.id),
+                    )
+                    .returning(TaskORM.id)
+                    .execution_options(synchronize_session=False)
+                )
+                updated = set(result.scalars())
+                await db.commit()
+            oks = [i in updated for i in ids]
+    results = _batch_results(ids, oks, 200, 404, "Task not found")
+    if any(oks):
+        _invalidate_reads()
+    _log_batch(request, "update", results)
+    return results
+
+@app.delete("/tasks/batch", response_model=list[BatchItemResult], dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def delete_tasks(
+    request: Request,
+    ids: list[int] = Body(..., max_length=_BATCH_MAX),
+    db: Optional[AsyncSession] = Depends(get_db),
+):
+    with phase("query"):
+        if SessionLocal is None:
+            oks = await _file_batch("delete", ids)
+        else:
+            deleted = set()
+            if ids:
+                result = await db.execute(
+                    sql_delete(TaskORM)
+                    .where(TaskORM.id.in_(set(ids)))
+                    .returning(TaskORM.id)
+                    .execution_options(synchronize_session=False)
+                )
+                deleted = set(result.scalars())
+                await db.commit()
+            # A repeated id only counts as deleted the first time
+            oks = []
+            for i in ids:
+                oks.append(i in deleted)
+                deleted.discard(i)
+    results = _batch_results(ids, oks, 200, 404, "Task not found")
+    if any(oks):
+        _invalidate_reads()
+    _log_batch(request, "delete", results)
+    return results
+
+# --- Streaming list responses ---------------------------------------------
+_STREAM_PAGE = 500
+
+async def _stream_task_pages(after_id: Optional[int], limit: Optional[int]):
+    """Yield tasks as lists of dicts in id order, one page at a time."""
+    if SessionLocal is None:
+        # Walk the resident store's sorted index page by page
+        cursor, remaining = after_id, limit
+        while remaining is None or remaining > 0:
+            n = _STREAM_PAGE if remaining is None else min(_STREAM_PAGE, remaining)
+            page = await _store(_task_store.page, cursor, n)
+            if not page:
+                return
+            yield [t.model_dump() for t in page]
+            cursor = page[-1].id
+            if remaining is not None:
+                remaining -= len(page)
+        return
+    stmt = select(TaskORM.id, TaskORM.title, TaskORM.completed).order_by(TaskORM.id)
+    if after_id is not None:
+        stmt = stmt.where(TaskORM.id > after_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    # The request's get_db session is closed before a streaming body is sent,
+    # so the server-side cursor gets a session of its own.
+    async with SessionLocal() as session:
+        result = await session.stream(stmt.execution_options(yield_per=_STREAM_PAGE))
+        async for part in result.partitions():
+            yield [{"id": r.id, "title": r.title, "completed": r.completed} for r in part]
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+async def _encode_task_stream(pages, fmt: str):
+    if fmt == "ndjson":
+        async for page in pages:
+            yield "".join(_dumps(t) + "\n" for t in page).encode("utf-8")
+        return
+    # Chunked JSON array
+    yield b"["
+    sep = ""
+    async for page in pages:
+        yield (sep + ",".join(_dumps(t) for t in page)).encode("utf-8")
+        sep = ","
+    yield b"]"
+
+# --- Coalesced reads -------------------------------------------------------
+# Identical list/get reads that arrive while one is in flight share its
+# result instead of each parsing the file or running a SELECT
+# (READ_COALESCE=0 turns this off). In DB mode the fetch opens its own
+# session, so joined requests do not check out a connection either.
+_READ_COALESCE = os.getenv("READ_COALESCE", "1") == "1"
+_reads = SingleFlight()
+Counter(_registry, "read_coalesce_requests_total", "Task reads by op", ("op",),
+        collect=lambda: {(op,): n for op, n in _reads.calls.items()})
+Counter(_registry, "read_coalesce_fetches_total", "Task reads that went to the store or database, by op", ("op",),
+        collect=lambda: {(op,): n for op, n in _reads.fetches.items()})
+# The dedup ratio is 1 - fetches/requests; it is left to the query
+# (1 - rate(read_coalesce_fetches_total) / rate(read_coalesce_requests_total))
+# because per-worker ratios do not merge across processes
+
+async def _read(op: str, key, fn, *args):
+    if not _READ_COALESCE:
+        return await fn(*args)
+    return await _reads.do(op, key, fn, *args)
+
+async def _fetch_tasks(after_id: Optional[int], fetch: Optional[int]) -> list:
     if SessionLocal is None:
-        return _file_load_tasks()
-    result = await db.execute(select(TaskORM).order_by(TaskORM.id))
-    rows = result.scalars().all()
+        with phase("query"):
+            if after_id is None and fetch is None:
+                return await _store(_task_store.list)
+            return await _store(_task_store.page, after_id, fetch)
+    stmt = select(TaskORM).order_by(TaskORM.id)
+    if after_id is not None:
+        stmt = stmt.where(TaskORM.id > after_id)
+    if fetch is not None:
+        stmt = stmt.limit(fetch)
+    async with SessionLocal() as db:
+        with phase("db_acquire"):
+            await db.connection()
+        with phase("query"):
+            rows = (await db.execute(stmt)).scalars().all()
     return [Task(id=r.id, title=r.title, completed=r.completed) for r in rows]
 
+async def _fetch_task(task_id: int) -> Optional[Task]:
+    if SessionLocal is None:
+        with phase("query"):
+            return await _store(_task_store.get, task_id)
+    async with SessionLocal() as db:
+        with phase("db_acquire"):
+            await db.connection()
+        with phase("query"):
+            row = (await db.execute(select(TaskORM).where(TaskORM.id == task_id))).scalar_one_or_none()
+    return None if row is None else Task(id=row.id, title=row.title, completed=row.completed)
+
+# --- Response cache --------------------------------------------------------
+# Encoded list/get response bodies and their ETags, served as raw Responses
+# (If-None-Match gets a 304) until the data changes. File mode keys entries
+# on the store's version, which every write and every reload of another
+# worker's changes bumps. DB mode is opt-in (RESPONSE_CACHE_DB_TTL_S > 0):
+# this process's writes invalidate it, other processes' after the TTL.
+_RESPONSE_CACHE_DB_TTL = float(os.getenv("RESPONSE_CACHE_DB_TTL_S", "0"))
+_response_cache = None
+if os.getenv("RESPONSE_CACHE", "1") == "1" and (SessionLocal is None or _RESPONSE_CACHE_DB_TTL > 0):
+    _response_cache = ResponseCache(
+        _RESPONSE_CACHE_DB_TTL if SessionLocal is not None else None,
+        int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000")),
+        int(os.getenv("RESPONSE_CACHE_MAX_MB", "32")) * 1024 * 1024,
+    )
+    Counter(_registry, "response_cache_lookups_total", "Task read response cache lookups", ("result",),
+            collect=lambda: {("hit",): _response_cache.hits, ("miss",): _response_cache.misses})
+    Gauge(_registry, "response_cache_entries", "Encoded task responses held in the cache",
+          collect=lambda: {(): len(_response_cache)})
+    Gauge(_registry, "response_cache_bytes", "Bytes of encoded task responses held in the cache",
+          collect=lambda: {(): _response_cache.bytes})
+
+async def _cache_tag():
+    # Read before fetching, so data fetched across a write is filed under the old tag
+    if SessionLocal is None:
+        return await _store(_task_store.version)
+    return _response_cache.generation
+
+def _invalidate_reads() -> None:
+    if _response_cache is not None:
+        _response_cache.clear()
+
+def _encode_tasks(tasks) -> bytes:
+    # Same bytes FastAPI's JSONResponse would produce for the response_model
+    return _dumps(tasks).encode("utf-8")
+
+def _cached_response(request: Request, entry) -> Response:
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    return Response(entry.body, media_type="application/json", headers=entry.headers)
+
+def _trim_page(items: list, limit: Optional[int]):
+    """Drop the extra row fetched past `limit`; returns (items, next cursor or None)."""
+    if limit is not None and len(items) > limit:
+        items = items[:limit]
+        return items, str(items[-1].id)
+    return items, None
+
+async def _list_entry(after_id: Optional[int], limit: Optional[int], tag):
+    items, cursor = _trim_page(await _fetch_tasks(after_id, None if limit is None else limit + 1), limit)
+    body = _encode_tasks([t.model_dump() for t in items])
+    return _response_cache.put(("list", after_id, limit), tag, body, {"X-Next-Cursor": cursor} if cursor else None)
+
+async def _task_entry(task_id: int, tag):
+    t = await _fetch_task(task_id)
+    if t is None:
+        return None
+    return _response_cache.put(("get", task_id), tag, _encode_tasks(t.model_dump()))
+
+# Get all tasks, or one keyset page of them when limit/after_id are given.
+# A full page sets X-Next-Cursor to the after_id of the next page.
+# stream=ndjson|json sends the (optionally filtered) list incrementally
+# with constant memory instead of building it up front.
+@app.get("/tasks/", response_model=list[Task])
+async def get_tasks(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after_id: Optional[int] = None,
+    stream: Optional[Literal["ndjson", "json"]] = None,
+):
+    if stream is not None:
+        media_type = "application/x-ndjson" if stream == "ndjson" else "application/json"
+        return StreamingResponse(_encode_task_stream(_stream_task_pages(after_id, limit), stream), media_type=media_type)
+    # Only the full list and limit pages are cached: an after_id without a
+    # limit is nearly the whole list again for every distinct after_id
+    if _response_cache is not None and (after_id is None or limit is not None):
+        # Coalesced per tag, so a request never joins a fetch older than its tag
+        tag = await _cache_tag()
+        entry = _response_cache.get(("list", after_id, limit), tag)
+        if entry is None:
+            entry = await _read("list", (after_id, limit, tag), _list_entry, after_id, limit, tag)
+        return _cached_response(request, entry)
+    # Fetch one extra row to know whether another page follows
+    fetch = None if limit is None else limit + 1
+    items, cursor = _trim_page(await _read("list", (after_id, fetch), _fetch_tasks, after_id, fetch), limit)
+    if cursor is not None:
+        response.headers["X-Next-Cursor"] = cursor
+    return items
+
 # Get a single task by ID
 @app.get("/tasks/{task_id}", response_model=Task)
-async def get_task(task_id: int, db: AsyncSession = Depends(get_db) if SessionLocal else None):
-    if SessionLocal is None:
-        items = _file_load_tasks()
-        for t in items:
-            if t.id == task_id:
-                return t
-        raise HTTPException(status_code=404, detail="Task not found")
-    result = await db.execute(select(TaskORM).where(TaskORM.id == task_id))
-    row = result.scalar_one_or_none()
-    if row is None:
+async def get_task(request: Request, task_id: int):
+    if _response_cache is not None:
+        tag = await _cache_tag()
+        entry = _response_cache.get(("get", task_id), tag)
+        if entry is None:
+            entry = await _read("get", (task_id, tag), _task_entry, task_id, tag)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        return _cached_response(request, entry)
+    t = await _read("get", task_id, _fetch_task, task_id)
+    if t is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    return Task(id=row.id, title=row.title, completed=row.completed)
+    return t
 
 # Update a task by ID
 @app.put("/tasks/{task_id}", response_model=Task, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-async def update_task(task_id: int, updated_task: Task, db: AsyncSession = Depends(get_db) if SessionLocal else None):
+async def update_task(request: Request, task_id: int, updated_task: Task, db: Optional[AsyncSession] = Depends(get_db)):
     if updated_task.id != task_id:
         raise HTTPException(status_code=400, detail="Task ID in body must match URL")
-    if SessionLocal is None:
-        items = _file_load_tasks()
-        found = False
-        for i, t in enumerate(items):
-            if t.id == task_id:
-                items[i] = updated_task
-                found = True
-                break
-        if not found:
-            raise HTTPException(status_code=404, detail="Task not found")
-        _file_save_tasks(items)
-    else:
-        result = await db.execute(select(TaskORM).where(TaskORM.id == task_id))
-        row = result.scalar_one_or_none()
-        if row is None:
-            raise HTTPException(status_code=404, detail="Task not found")
-        row.title = updated_task.title
-        row.completed = updated_task.completed
-        await db.commit()
-    try:
-        log_event("task_updated", {"id": updated_task.id, "title": updated_task.title, "completed": updated_task.completed})
-    except Exception as e:
-        if os.getenv("DEBUG"):
-            print(f"Splunk log failed (update): {e}", file=sys.stderr)
+    with phase("query"):
+        if SessionLocal is None:
+            commit = await _store(_task_store.update, updated_task, write=True)
+            if commit is None or not await asyncio.wrap_future(commit):
+                raise HTTPException(status_code=404, detail="Task not found")
+        else:
+            result = await db.execute(
+                sql_update(TaskORM)
+                .where(TaskORM.id == task_id)
+                .values(title=updated_task.title, completed=updated_task.completed)
+                .returning(TaskORM.id)
+                .execution_options(synchronize_session=False)
+            )
+            if result.scalar_one_or_none() is None:
+                raise HTTPException(status_code=404, detail="Task not found")
+            await db.commit()
+    _invalidate_reads()
+    with phase("log"):
+        try:
+            log_event("task_updated", {"id": updated_task.id, "title": updated_task.title, "completed": updated_task.completed,
+                                       **_endpoint_dims(request)})
+        except Exception as e:
+            if os.getenv("DEBUG"):
+                print(f"Splunk log failed (update): {e}", file=sys.stderr)
     return updated_task
 
 # Delete a task by ID
 @app.delete("/tasks/{task_id}", dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-async def delete_task(task_id: int, db: AsyncSession = Depends(get_db) if SessionLocal else None):
-    if SessionLocal is None:
-        items = _file_load_tasks()
-        new_items = [t for t in items if t.id != task_id]
-        if len(new_items) == len(items):
-            raise HTTPException(status_code=404, detail="Task not found")
-        _file_save_tasks(new_items)
-    else:
-        result = await db.execute(select(TaskORM).where(TaskORM.id == task_id))
-        row = result.scalar_one_or_none()
-        if row is None:
-            raise HTTPException(status_code=404, detail="Task not found")
-        await db.execute(sql_delete(TaskORM).where(TaskORM.id == task_id))
-        await db.commit()
-    try:
-        log_event("task_deleted", {"id": task_id})
-    except Exception as e:
-        if os.getenv("DEBUG"):
-            print(f"Splunk log failed (delete): {e}", file=sys.stderr)
+async def delete_task(request: Request, task_id: int, db: Optional[AsyncSession] = Depends(get_db)):
+    with phase("query"):
+        if SessionLocal is None:
+            commit = await _store(_task_store.delete, task_id, write=True)
+            if commit is None or not await asyncio.wrap_future(commit):
+                raise HTTPException(status_code=404, detail="Task not found")
+        else:
+            result = await db.execute(
+                sql_delete(TaskORM)
+                .where(TaskORM.id == task_id)
+                .returning(TaskORM.id)
+                .execution_options(synchronize_session=False)
+            )
+            if result.scalar_one_or_none() is None:
+                raise HTTPException(status_code=404, detail="Task not found")
+            await db.commit()
+    _invalidate_reads()
+    with phase("log"):
+        try:
+            log_event("task_deleted", {"id": task_id, **_endpoint_dims(request)})
+        except Exception as e:
+            if os.getenv("DEBUG"):
+                print(f"Splunk log failed (delete): {e}", file=sys.stderr)
     return {"detail": "Task deleted"}
 
-# Example Splunk Dashboard SPL:
+# Example Splunk Dashboard SPL (http_request events may be sampled; weight
+# counts and averages by sample_weight, since slow and 5xx requests are
+# always kept):
 # index="main" sourcetype="http_request"
-# | timechart count by status
+# | timechart sum(sample_weight) as count by status
 # | eval latency_bucket=round(latency_ms/100,0)*100
-# | timechart avg(latency_ms) by path
+# | eval weighted_ms=latency_ms*sample_weight
+# | timechart eval(sum(weighted_ms)/sum(sample_weight)) as avg_latency_ms by path
+#
+# With REQUEST_METRICS=1 (http_request_summary events, per route template):
+# index="main" type="http_request_summary"
+# | timechart sum(count) as requests, max(p95_ms) as p95, max(p99_ms) as p99 by route
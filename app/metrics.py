@@ -0,0 +1,384 @@
+import os
+import math
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+"""
+In-process request metrics: per-interval rollups for the log pipeline
+(RequestMetrics) and the registry behind the Prometheus /metrics endpoint.
+
+Rollups: every request is recorded under (method, route template, status
+class) with a count, an error count and a latency histogram over fixed
+log-spaced buckets (4 per doubling, so any percentile read from it is
+within ~19% of the true value). Once per interval each key is emitted as
+one "http_request_summary" event, so log volume depends on the number of
+routes rather than on traffic, and p95/p99 survive the aggregation.
+
+Prometheus: Counter/Gauge/Histogram keep their values in plain dicts and
+render in the text exposition format. With a multiproc_dir
+(PROMETHEUS_MULTIPROC_DIR) every process periodically writes a snapshot to
+<dir>/<pid>.json and a scrape in any worker merges all of them: counters
+and histograms are summed, gauges are summed or maxed per metric and
+dropped for processes that have exited. Like prometheus_client's
+multiprocess mode, the directory should be emptied when the server
+(re)starts.
+"""
+
+_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+# Upper bounds in ms: 0.1ms .. ~105s; slower requests land in the last bucket
+_BOUNDS: List[float] = [round(0.1 * 2 ** (i / 4), 4) for i in range(81)]
+
+Key = Tuple[str, str, str]
+
+
+def method_label(method: str) -> str:
+    """Client-supplied methods outside the usual set share one label value."""
+    return method if method in _METHODS else "OTHER"
+
+
+def _bucket(latency_ms: float) -> int:
+    if latency_ms <= _BOUNDS[0]:
+        return 0
+    i = math.ceil(4 * math.log2(latency_ms / 0.1))
+    return min(i, len(_BOUNDS) - 1)
+
+
+class _Series:
+    __slots__ = ("count", "errors", "total", "low", "high", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.low = math.inf
+        self.high = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def percentile(self, q: float) -> float:
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen >= rank:
+                # Clamp to the observed range so small samples read sensibly
+                return min(max(_BOUNDS[i], self.low), self.high)
+        return self.high
+
+
+class RequestMetrics:
+    """Per-interval request rollups, emitted through `emit(event_type, props)`."""
+
+    def __init__(self, emit: Callable[[str, Dict[str, Any]], None], interval: float = 60.0):
+        self._emit = emit
+        self._interval = interval
+        self._series: Dict[Key, _Series] = {}
+        self._started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, method: str, route: Optional[str], status: int, latency_ms: float) -> None:
+        key = (method_label(method), route or "unmatched", f"{status // 100}xx")
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = _Series()
+            s.count += 1
+            if status >= 500:
+                s.errors += 1
+            s.total += latency_ms
+            s.low = min(s.low, latency_ms)
+            s.high = max(s.high, latency_ms)
+            b = _bucket(latency_ms)
+            s.buckets[b] = s.buckets.get(b, 0) + 1
+        self.flush_due()
+
+    def flush_due(self) -> None:
+        """Emit the current interval if it has run its full length."""
+        if time.time() - self._started >= self._interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Emit one summary event per key and start a new interval."""
+        with self._lock:
+            series, self._series = self._series, {}
+            started, self._started = self._started, time.time()
+        interval_s = round(self._started - started, 3)
+        for (method, route, status_class), s in series.items():
+            self._emit("http_request_summary", {
+                "method": method,
+                "route": route,
+                "status_class": status_class,
+                "interval_start": int(started),
+                "interval_s": interval_s,
+                "count": s.count,
+                "errors": s.errors,
+                "latency_avg_ms": round(s.total / s.count, 2),
+                "latency_min_ms": round(s.low, 2),
+                "latency_max_ms": round(s.high, 2),
+                "p50_ms": round(s.percentile(0.50), 2),
+                "p95_ms": round(s.percentile(0.95), 2),
+                "p99_ms": round(s.percentile(0.99), 2),
+                # Sparse histogram keyed by bucket upper bound, so intervals
+                # and instances can be merged before taking percentiles
+                "buckets": {str(_BOUNDS[i]): n for i, n in sorted(s.buckets.items())},
+            })
+
+
+# --- Prometheus ------------------------------------------------------------
+Labels = Tuple[str, ...]
+
+# Seconds; default latency buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Labels:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def snapshot(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, registry: "Registry", name: str, help: str, labelnames: Iterable[str] = (),
+                 collect: Optional[Callable[[], Dict[Labels, float]]] = None):
+        super().__init__(registry, name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._collect = collect
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        values = self._collect() if self._collect else dict(self._values)
+        return {"samples": [[list(k), v] for k, v in values.items()]}
+
+
+class Gauge(_Metric):
+    """A gauge; `mode` says how values from several processes combine ("sum" or "max")."""
+
+    kind = "gauge"
+
+    def __init__(self, registry: "Registry", name: str, help: str, labelnames: Iterable[str] = (),
+                 collect: Optional[Callable[[], Dict[Labels, float]]] = None, mode: str = "sum"):
+        super().__init__(registry, name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._collect = collect
+        self.mode = mode
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        values = self._collect() if self._collect else dict(self._values)
+        return {"mode": self.mode, "samples": [[list(k), v] for k, v in values.items()]}
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry: "Registry", name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Labels, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        i = 0
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            v[0][i] += 1
+            v[1] += value
+
+    def time(self, **labels: Any) -> "_Timer":
+        return _Timer(self, labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = [[list(k), [list(v[0]), v[1]]] for k, v in self._values.items()]
+        return {"buckets": list(self.buckets), "samples": samples}
+
+
+class _Timer:
+    def __init__(self, hist: Histogram, labels: Dict[str, Any]):
+        self._hist = hist
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self._hist.observe(time.perf_counter() - self._start, **self._labels)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Registry:
+    """The set of metrics exposed by /metrics."""
+
+    def __init__(self, multiproc_dir: Optional[str] = None, sync_interval: float = 1.0):
+        self._metrics: List[_Metric] = []
+        self._dir = Path(multiproc_dir) if multiproc_dir else None
+        self._sync_interval = sync_interval
+        self._writer_pid: Optional[int] = None
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def snapshot(self) -> Dict[str, Any]:
+        snap = {}
+        for m in self._metrics:
+            try:
+                data = m.snapshot()
+            except Exception:
+                continue
+            snap[m.name] = {"kind": m.kind, "help": m.help, "labelnames": list(m.labelnames), **data}
+        return snap
+
+    # --- Multi-process -----------------------------------------------------
+    def start_sync(self) -> None:
+        """Write this process's snapshot to the shared directory every sync_interval."""
+        if self._dir is None or self._writer_pid == os.getpid():
+            return
+        self._writer_pid = os.getpid()
+        self._dir.mkdir(parents=True, exist_ok=True)
+        threading.Thread(target=self._sync_loop, name="metrics-sync", daemon=True).start()
+
+    def _sync_loop(self) -> None:
+        while True:
+            try:
+                self.write_snapshot()
+            except Exception:
+                pass
+            time.sleep(self._sync_interval)
+
+    def write_snapshot(self) -> None:
+        assert self._dir is not None
+        path = self._dir / f"{os.getpid()}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.snapshot()), encoding="utf-8")
+        tmp.replace(path)
+
+    def _collect(self) -> Dict[str, Any]:
+        own = self.snapshot()
+        if self._dir is None:
+            return own
+        snaps = [own]
+        for path in self._dir.glob("*.json"):
+            try:
+                pid = int(path.stem)
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                snap = json.loads(path.read_text("utf-8"))
+            except Exception:
+                continue
+            if not _pid_alive(pid):
+                # Keep what a dead worker counted, but not its gauges
+                snap = {k: v for k, v in snap.items() if v["kind"] != "gauge"}
+            snaps.append(snap)
+        return _merge(snaps)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+        for name, m in self._collect().items():
+            lines.append(f"# HELP {name} {m['help']}")
+            lines.append(f"# TYPE {name} {m['kind']}")
+            names = m["labelnames"]
+            for key, value in m["samples"]:
+                pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, key)]
+                if m["kind"] != "histogram":
+                    lines.append(f"{name}{_labels(pairs)} {_fmt(value)}")
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, n in zip(m["buckets"] + [math.inf], counts):
+                    cumulative += n
+                    le = 'le="%s"' % _fmt(bound)
+                    lines.append(f"{name}_bucket{_labels(pairs + [le])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(pairs)} {_fmt(total)}")
+                lines.append(f"{name}_count{_labels(pairs)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(pairs: List[str]) -> str:
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _merge(snaps: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merged: Dict[str, Any] = {}
+    for snap in snaps:
+        for name, m in snap.items():
+            into = merged.get(name)
+            if into is None:
+                into = merged[name] = {**m, "samples": {}}
+            samples = into["samples"]
+            for key, value in m["samples"]:
+                key = tuple(key)
+                prev = samples.get(key)
+                if prev is None:
+                    samples[key] = value
+                elif m["kind"] == "histogram":
+                    samples[key] = [[a + b for a, b in zip(prev[0], value[0])], prev[1] + value[1]]
+                elif m["kind"] == "gauge" and m.get("mode") == "max":
+                    samples[key] = max(prev, value)
+                else:
+                    samples[key] = prev + value
+    for m in merged.values():
+        m["samples"] = [[list(k), v] for k, v in m["samples"].items()]
+    return merged
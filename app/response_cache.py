@@ -0,0 +1,85 @@
+import hashlib
+import time
+from typing import Any, Dict, Hashable, Optional
+
+"""
+Cache of encoded response bodies for task reads.
+
+Each entry holds the final JSON bytes, a strong ETag (a hash of the bytes)
+and any extra headers, stored under a key (e.g. ("list", after_id, limit))
+together with a `tag` describing the data it was built from. A lookup hits
+only when the caller's current tag matches, so callers pick a tag that
+changes whenever the data may have: the file store's version, or this
+cache's `generation`, which clear() bumps on every write.
+
+Callers must read the tag *before* fetching the data they encode; an entry
+built from data fetched across a write is then stored under the old tag and
+never served. With `ttl` set, entries also expire after that many seconds
+(for data that other processes can change without telling this one).
+Entries are evicted oldest first beyond `max_entries` or once their
+bodies add up to more than `max_bytes`; a body larger than `max_bytes` on
+its own is returned but not kept. Everything runs on the event loop
+thread, so there is no locking.
+"""
+
+
+class Entry:
+    __slots__ = ("tag", "body", "etag", "headers", "expires")
+
+    def __init__(self, tag: Any, body: bytes, headers: Dict[str, str], expires: Optional[float]):
+        self.tag = tag
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.headers = {**headers, "ETag": self.etag}
+        self.expires = expires
+
+
+class ResponseCache:
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = 10000, max_bytes: int = 32 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(0, max_bytes)
+        self.bytes = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[Hashable, Entry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, tag: Any) -> Optional[Entry]:
+        entry = self._entries.get(key)
+        if entry is None or entry.tag != tag or (entry.expires is not None and entry.expires < time.monotonic()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, tag: Any, body: bytes, headers: Optional[Dict[str, str]] = None) -> Entry:
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        entry = Entry(tag, body, headers or {}, expires)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= len(old.body)
+        if len(body) > self.max_bytes:
+            return entry
+        self._entries[key] = entry
+        self.bytes += len(body)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self.bytes -= len(self._entries.pop(next(iter(self._entries))).body)
+        return entry
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self.bytes = 0
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header value matches `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in if_none_match.split(","))
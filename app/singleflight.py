@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+"""
+Single-flight coalescing of identical concurrent reads.
+
+SingleFlight.do(op, key, fn, *args) runs `fn(*args)` unless a call with
+the same (op, key) is already in flight, in which case it awaits that
+call's result (or exception) instead. Nothing is cached: once the fetch
+completes, the next call starts a new one, so a reader can only see data
+as old as the in-flight window.
+
+The fetch runs as its own task, so a caller that disconnects does not
+cancel it for the others waiting on it. Per-op `calls` and `fetches`
+counters give the dedup ratio, 1 - fetches / calls.
+"""
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._inflight: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        self.calls: Dict[str, int] = {}
+        self.fetches: Dict[str, int] = {}
+
+    async def do(self, op: str, key: Hashable, fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        self.calls[op] = self.calls.get(op, 0) + 1
+        k = (op, key)
+        fut = self._inflight.get(k)
+        if fut is None or fut.get_loop() is not asyncio.get_running_loop():
+            self.fetches[op] = self.fetches.get(op, 0) + 1
+            fut = asyncio.ensure_future(fn(*args))
+            self._inflight[k] = fut
+            fut.add_done_callback(lambda f: self._inflight.pop(k, None) if self._inflight.get(k) is f else None)
+        return await asyncio.shield(fut)
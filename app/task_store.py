@@ -0,0 +1,632 @@
+import os
+import sys
+import json
+import atexit
+import threading
+import time
+from bisect import bisect_right, insort
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+try:
+    import fcntl  # POSIX only; shared mode needs it
+except Exception:
+    fcntl = None  # type: ignore
+try:
+    import watchfiles  # type: ignore
+except Exception:
+    watchfiles = None
+
+"""
+Resident task store for file-backed mode (no DATABASE_URL).
+
+Tasks are loaded once into a dict keyed by id, so reads are O(1) and never
+touch the disk; a sorted list of ids alongside it serves keyset pages.
+Mutations are applied in order to the dict under a lock and queue an op
+record plus a commit future. A background flusher thread groups every op
+queued within `flush_delay` into one write + fsync (group commit) and then
+resolves the batch's futures, so callers can wait until their write is
+durable without each paying for its own rewrite. If the write fails, the
+batch (and anything queued behind it) is undone in memory and its futures
+fail, so a failed request never shows up later.
+
+How durable "durable" is depends on the durability mode:
+  none      Write only; the OS page cache decides when data hits the disk.
+  interval  Write, resolve, and fsync file + directory at most every
+            `fsync_interval` seconds (a crash loses up to one interval).
+  always    fsync file + directory before the batch resolves.
+
+Two persistence layouts are supported:
+  snapshot  Every flush rewrites the whole list through the save helper
+            (tmp file + atomic replace).
+  journal   Every flush appends one compact JSON line per op to a journal
+            next to the snapshot. Startup replays snapshot + journal, and
+            once the journal passes `compact_bytes` it is folded into a new
+            snapshot (atomic replace) and truncated. Ops are idempotent
+            puts/deletes, so a crash between the two steps only replays ops
+            the snapshot already contains.
+
+With `shared=True` several processes (uvicorn workers) may use the same
+files. Each flush then runs under an exclusive flock on `<file>.lock`,
+first folding in whatever other processes wrote and then writing, so no
+process overwrites another's changes. Queued ops are checked again against
+the folded-in data: a create of an id another process committed first, or
+an update/delete of a task it deleted, is dropped and its caller told the
+op was rejected. Reads compare the files'
+(st_ino, st_mtime_ns, st_size) with what this process last saw and
+reload when another process changed them. When watchfiles is installed a
+watcher thread (inotify/FSEvents) marks the store stale whenever one of the
+files changes, so reads skip even the stat until something happened;
+without it every read costs one stat. Reads never wait on the flock: if it
+is busy the current in-memory copy is served and the next read retries.
+Writes never take those shortcuts: each one takes the flock, compares stat
+keys and reloads if needed before checking and applying the op.
+"""
+
+
+DURABILITY_MODES = ("none", "interval", "always")
+
+# Whether shared mode (flock) is available on this platform
+HAVE_FLOCK = fcntl is not None
+
+
+StatKey = Optional[Tuple[int, int, int]]
+
+
+def stat_key(path: Path) -> StatKey:
+    """(st_ino, st_mtime_ns, st_size) of `path`, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def fsync_dir(path: Path) -> None:
+    """fsync the directory containing `path` so a create/rename is durable."""
+    fd = os.open(str(path.parent), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _Call:
+    """One write call: its commit future and which of its ops still stand.
+
+    An op can be accepted against this process's copy and then turn out to
+    conflict with what another process committed first (shared mode); it
+    is then dropped and its flag cleared before the future resolves.
+    """
+
+    __slots__ = ("future", "oks", "single")
+
+    def __init__(self, n: int, single: bool) -> None:
+        self.future: Future = Future()
+        self.oks = [False] * n
+        self.single = single
+
+    def resolve(self) -> None:
+        self.future.set_result(self.oks[0] if self.single else self.oks)
+
+
+class FileTaskStore:
+    def __init__(
+        self,
+        path: Path,
+        load: Callable[[], List[Any]],
+        save: Callable[[List[Any], bool], None],
+        flush_delay: float = 0.002,
+        journal: Optional[Path] = None,
+        model: Optional[Callable[..., Any]] = None,
+        compact_bytes: int = 1024 * 1024,
+        durability: str = "always",
+        fsync_interval: float = 1.0,
+        shared: bool = False,
+    ) -> None:
+        if journal is not None and model is None:
+            raise ValueError("journal mode needs a model to rebuild tasks from records")
+        if shared and fcntl is None:
+            raise ValueError("shared mode needs fcntl.flock (POSIX)")
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {', '.join(DURABILITY_MODES)}")
+        self._path = path
+        self._load = load
+        self._save = save
+        self._flush_delay = flush_delay
+        self._journal = journal
+        self._model = model
+        self._compact_bytes = compact_bytes
+        self._durability = durability
+        self._fsync_interval = fsync_interval
+        self._unsynced = False
+        self._last_sync = time.monotonic()
+        self._shared = shared
+        self._lock_path = path.with_suffix(".lock")
+        self._disk_key: Tuple[StatKey, StatKey] = (None, None)
+        self._watching = False
+        self._stale = True
+        self._watcher: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
+        self._tasks: Dict[int, Any] = {}
+        self._ids: List[int] = []  # sorted keys of self._tasks
+        self._pending: List[Dict[str, Any]] = []
+        self._waiters: List[_Call] = []
+        self._loaded = False
+        self._version = 0  # bumped on every change to self._tasks
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    # --- Loading -----------------------------------------------------------
+    def ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._file_lock(), self._lock:
+            if self._loaded:
+                return
+            self._reload()
+            self._loaded = True
+        self._start_flusher()
+        if self._shared:
+            self._start_watcher()
+
+    def _reload(self) -> None:
+        """Rebuild the dict from disk, then re-apply ops not yet flushed.
+
+        Each pending op is checked again against the reloaded data: a
+        create whose id another process has since taken, or an update or
+        delete of a task it has since deleted, is dropped and reported as
+        rejected to its caller.
+
+        Caller holds self._lock (and the file lock in shared mode).
+        """
+        self._tasks = {t.id: t for t in self._load()}
+        if self._journal is not None:
+            self._replay_journal()
+        pending = []
+        for op in self._pending:
+            exists = (op["task"].id if op["op"] == "put" else op["id"]) in self._tasks
+            if exists != op["exists"]:
+                op["call"].oks[op["i"]] = False
+                continue
+            op["prev"] = self._tasks.get(op["task"].id if op["op"] == "put" else op["id"])
+            self._apply(op)
+            pending.append(op)
+        self._pending = pending
+        self._ids = sorted(self._tasks)
+        self._disk_key = self._current_key()
+        self._version += 1
+
+    def _current_key(self) -> Tuple[StatKey, StatKey]:
+        return (stat_key(self._path), stat_key(self._journal) if self._journal is not None else None)
+
+    def is_fresh(self, write: bool = False) -> bool:
+        """True when a read (or `write`) will not touch the disk or wait on a reload.
+
+        Callers on an event loop can then call the store inline and hand
+        everything else to a thread. A held lock means a flush or reload is
+        in progress, which an inline call would have to wait out. Writes in
+        shared mode always take the flock, so they are never fresh.
+        """
+        if not self._loaded or self._lock.locked():
+            return False
+        if write:
+            return not self._shared
+        return not self._shared or (self._watching and not self._stale)
+
+    def revalidate(self) -> None:
+        """Pick up changes other processes made to the files (shared mode).
+
+        For reads only: it trusts the watcher and gives up when the flock is
+        busy, so it may leave this process's copy behind. Writes check under
+        the flock instead (_reload_if_changed).
+        """
+        if not self._shared or not self._loaded:
+            return
+        if self._watching:
+            if not self._stale:
+                return
+            self._stale = False
+        if self._current_key() == self._disk_key:
+            return
+        with self._file_lock(blocking=False) as locked:
+            if not locked:
+                # Another writer (possibly our own flusher) is mid-write;
+                # serve what we have rather than block the caller.
+                self._stale = True
+                return
+            with self._lock:
+                if self._current_key() != self._disk_key:
+                    self._reload()
+
+    def _reload_if_changed(self) -> None:
+        """Reload if another process changed the files since we last read them.
+
+        Always compares stat keys, never the watcher flag. Caller holds
+        self._lock and, in shared mode, the file lock.
+        """
+        if self._shared and self._current_key() != self._disk_key:
+            self._reload()
+
+    def _warn_if_changed(self) -> None:
+        """Complain when something else wrote the files (non-shared mode).
+
+        This process does not reload, so its next write replaces whatever
+        the other writer did. Printed regardless of DEBUG since it means
+        several processes use the files with TASKS_SHARED=0.
+        """
+        key = self._current_key()
+        if key != self._disk_key:
+            self._disk_key = key
+            print(f"Task store: {self._path} was changed by another process and its changes will be "
+                  "overwritten; use shared mode when several processes write the same file", file=sys.stderr)
+
+    def _start_watcher(self) -> None:
+        if watchfiles is None or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch_loop, name="task-store-watcher", daemon=True)
+        self._watching = True
+        self._watcher.start()
+        # The watcher blocks inside native code; let it exit before the
+        # interpreter finalizes or the process aborts on shutdown.
+        atexit.register(self._stop_watcher)
+
+    def _stop_watcher(self) -> None:
+        self._watch_stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=1.0)
+
+    def _watch_loop(self) -> None:
+        names = {self._path.name}
+        if self._journal is not None:
+            names.add(self._journal.name)
+        try:
+            for _changes in watchfiles.watch(
+                self._path.parent,
+                watch_filter=lambda _change, p: Path(p).name in names,
+                debounce=50,
+                step=5,
+                recursive=False,
+                stop_event=self._watch_stop,
+                raise_interrupt=False,
+            ):
+                self._stale = True
+        except Exception as e:
+            if os.getenv("DEBUG"):
+                print(f"Task file watcher stopped, falling back to stat per read: {e}", file=sys.stderr)
+        self._stale = True
+        self._watching = False
+
+    class _NoLock:
+        def __enter__(self) -> bool:
+            return True
+
+        def __exit__(self, *exc: Any) -> None:
+            return None
+
+    class _FileLock:
+        def __init__(self, path: Path, blocking: bool) -> None:
+            self._path = path
+            self._blocking = blocking
+            self._fd: Optional[int] = None
+
+        def __enter__(self) -> bool:
+            self._fd = os.open(str(self._path), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX if self._blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(self._fd)
+                self._fd = None
+                return False
+            return True
+
+        def __exit__(self, *exc: Any) -> None:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
+
+    def _file_lock(self, blocking: bool = True) -> Any:
+        """Cross-process exclusive lock in shared mode, a no-op otherwise."""
+        if not self._shared:
+            return self._NoLock()
+        return self._FileLock(self._lock_path, blocking)
+
+    def _replay_journal(self) -> None:
+        assert self._journal is not None
+        if not self._journal.exists():
+            return
+        good = 0
+        with self._journal.open("rb") as f:
+            for line in f:
+                # Torn tail from a crash mid-append: drop it so new records
+                # do not get glued onto a partial line. A record that lost
+                # only its newline still parses, so require the newline too.
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    rec = json.loads(line)
+                    if rec["op"] == "put":
+                        rec["task"] = self._model(**rec["task"])
+                    self._apply(rec)
+                except Exception:
+                    break
+                good += len(line)
+        if good != self._journal.stat().st_size:
+            with self._journal.open("r+b") as f:
+                f.truncate(good)
+
+    def _apply(self, rec: Dict[str, Any]) -> None:
+        if rec["op"] == "put":
+            self._tasks[rec["task"].id] = rec["task"]
+        elif rec["op"] == "del":
+            self._tasks.pop(rec["id"], None)
+
+    def _start_flusher(self) -> None:
+        if self._flusher is not None:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name="task-store-flusher", daemon=True)
+        self._flusher.start()
+
+    # --- Reads -------------------------------------------------------------
+    def get(self, task_id: int) -> Optional[Any]:
+        self.ensure_loaded()
+        self.revalidate()
+        return self._tasks.get(task_id)
+
+    def list(self) -> List[Any]:
+        self.ensure_loaded()
+        self.revalidate()
+        return list(self._tasks.values())
+
+    def page(self, after_id: Optional[int], limit: Optional[int]) -> List[Any]:
+        """Tasks with id > after_id in id order, at most `limit` of them."""
+        self.ensure_loaded()
+        self.revalidate()
+        with self._lock:
+            start = 0 if after_id is None else bisect_right(self._ids, after_id)
+            end = len(self._ids) if limit is None else start + limit
+            return [self._tasks[i] for i in self._ids[start:end]]
+
+    def version(self) -> int:
+        """Counter that changes whenever the tasks may have, including reloads.
+
+        Read it before the data it describes, so a change in between shows
+        up as a newer version rather than being missed.
+        """
+        self.ensure_loaded()
+        self.revalidate()
+        return self._version
+
+    # --- Writes ------------------------------------------------------------
+    # Each returns None when the op is rejected, otherwise a future that
+    # resolves once the batch containing the op is on disk: to True, or to
+    # False if the op was dropped because another process's write got
+    # there first (shared mode only).
+    def create(self, task: Any) -> Optional[Future]:
+        """Insert a new task. Returns None if the id already exists."""
+        return self._single(self._create, task)
+
+    def update(self, task: Any) -> Optional[Future]:
+        """Replace an existing task. Returns None if the id is unknown."""
+        return self._single(self._update, task)
+
+    def delete(self, task_id: int) -> Optional[Future]:
+        """Remove a task. Returns None if the id is unknown."""
+        return self._single(self._delete, task_id)
+
+    def _single(self, apply: Callable[[Any, _Call, int], bool], arg: Any) -> Optional[Future]:
+        self.ensure_loaded()
+        with self._file_lock(), self._lock:
+            self._reload_if_changed()
+            call = _Call(1, single=True)
+            return self._commit(call) if apply(arg, call, 0) else None
+
+    def apply_batch(self, ops: List[Tuple[str, Any]]) -> Tuple[List[bool], Optional[Future]]:
+        """Apply ("create" | "update", task) / ("delete", id) ops in order.
+
+        Every op is applied under one lock hold and lands in the same flush.
+        Returns per-op success flags and a single commit future (None when
+        nothing was accepted) that resolves to the final flags, with ops
+        dropped in favour of another process's writes set to False.
+        """
+        self.ensure_loaded()
+        apply = {"create": self._create, "update": self._update, "delete": self._delete}
+        with self._file_lock(), self._lock:
+            self._reload_if_changed()
+            call = _Call(len(ops), single=False)
+            results = [apply[op](arg, call, i) for i, (op, arg) in enumerate(ops)]
+            return results, (self._commit(call) if any(results) else None)
+
+    # Caller holds self._lock for the helpers below. Each op records whether
+    # its id existed when it was accepted, so a reload can check it again,
+    # and the task it replaced, so a failed flush can undo it.
+    def _create(self, task: Any, call: _Call, i: int) -> bool:
+        if task.id in self._tasks:
+            return False
+        self._tasks[task.id] = task
+        insort(self._ids, task.id)
+        self._queue({"op": "put", "task": task, "exists": False, "prev": None}, call, i)
+        return True
+
+    def _update(self, task: Any, call: _Call, i: int) -> bool:
+        prev = self._tasks.get(task.id)
+        if prev is None:
+            return False
+        self._tasks[task.id] = task
+        self._queue({"op": "put", "task": task, "exists": True, "prev": prev}, call, i)
+        return True
+
+    def _delete(self, task_id: int, call: _Call, i: int) -> bool:
+        prev = self._tasks.pop(task_id, None)
+        if prev is None:
+            return False
+        del self._ids[bisect_right(self._ids, task_id) - 1]
+        self._queue({"op": "del", "id": task_id, "exists": True, "prev": prev}, call, i)
+        return True
+
+    def _queue(self, op: Dict[str, Any], call: _Call, i: int) -> None:
+        op["call"], op["i"] = call, i
+        call.oks[i] = True
+        self._pending.append(op)
+        self._version += 1
+
+    def _commit(self, call: _Call) -> Future:
+        self._waiters.append(call)
+        self._dirty.set()
+        return call.future
+
+    # --- Persistence -------------------------------------------------------
+    def flush(self) -> bool:
+        """Persist every op queued since the last flush as one batch.
+
+        Returns False if the batch could not be written.
+        """
+        with self._flush_lock, self._file_lock():
+            with self._lock:
+                # Fold in other processes' writes before ours so the
+                # snapshot we write does not drop them
+                self._reload_if_changed()
+                if not self._shared:
+                    self._warn_if_changed()
+                ops, self._pending = self._pending, []
+                waiters, self._waiters = self._waiters, []
+                self._dirty.clear()
+                if not ops:
+                    # Every queued op (if any) lost to another process's write
+                    for call in waiters:
+                        call.resolve()
+                    return True
+                items = list(self._tasks.values()) if self._journal is None else None
+            sync = self._durability == "always"
+            try:
+                if self._journal is None:
+                    self._save(items, sync)
+                else:
+                    self._append_journal(ops, sync)
+            except Exception as e:
+                # Nothing of the batch is on disk (snapshots are replaced
+                # atomically, a failed journal append is cut off), so undo it
+                # in memory and fail its requests. Ops queued since depend on
+                # it and are undone and failed with it.
+                with self._lock:
+                    waiters += self._waiters
+                    self._rollback(ops + self._pending)
+                    self._pending, self._waiters = [], []
+                    self._dirty.clear()
+                for call in waiters:
+                    call.future.set_exception(e)
+                if os.getenv("DEBUG"):
+                    print(f"Task store flush failed: {e}", file=sys.stderr)
+                return False
+            self._disk_key = self._current_key()
+            if self._durability == "interval":
+                self._unsynced = True
+            for call in waiters:
+                call.resolve()
+            if self._journal is not None and self._journal_size() > self._compact_bytes:
+                self._compact()
+            return True
+
+    def _rollback(self, ops: List[Dict[str, Any]]) -> None:
+        """Restore what each op replaced, newest first. Caller holds self._lock."""
+        for op in reversed(ops):
+            task_id = op["task"].id if op["op"] == "put" else op["id"]
+            if op["prev"] is None:
+                self._tasks.pop(task_id, None)
+            else:
+                self._tasks[task_id] = op["prev"]
+        self._ids = sorted(self._tasks)
+        self._version += 1
+
+    def _append_journal(self, ops: List[Dict[str, Any]], sync: bool) -> None:
+        assert self._journal is not None
+        lines = []
+        for op in ops:
+            rec = {"op": "put", "task": op["task"].model_dump()} if op["op"] == "put" else {"op": "del", "id": op["id"]}
+            lines.append(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+        data = "".join(lines)
+        created = not self._journal.exists()
+        start = self._journal_size()
+        try:
+            with self._journal.open("ab") as f:
+                f.write(data.encode("utf-8"))
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except Exception:
+            # Cut off whatever part of the batch made it in (e.g. ENOSPC
+            # mid-write): the retry would otherwise be glued onto a partial
+            # line, and replay stops at the first broken one
+            try:
+                with self._journal.open("r+b") as f:
+                    f.truncate(start)
+            except Exception:
+                pass
+            raise
+        if sync and created:
+            fsync_dir(self._journal)
+
+    def sync(self) -> None:
+        """fsync whatever earlier unsynced flushes wrote (interval mode)."""
+        with self._flush_lock:
+            if not self._unsynced:
+                return
+            target = self._journal if self._journal is not None else self._path
+            try:
+                fd = os.open(str(target), os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                fsync_dir(target)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                if os.getenv("DEBUG"):
+                    print(f"Task store fsync failed: {e}", file=sys.stderr)
+                return
+            self._unsynced = False
+            self._last_sync = time.monotonic()
+
+    def _journal_size(self) -> int:
+        try:
+            return self._journal.stat().st_size  # type: ignore[union-attr]
+        except FileNotFoundError:
+            return 0
+
+    def _compact(self) -> None:
+        """Fold the journal into a fresh snapshot. Caller holds self._flush_lock."""
+        assert self._journal is not None
+        with self._lock:
+            items = list(self._tasks.values())
+        try:
+            # The journal is the only synced copy of its ops until the new
+            # snapshot is on disk, so sync it before truncating the journal
+            # unless durability is "none"
+            self._save(items, self._durability != "none")
+            with self._journal.open("wb"):
+                pass
+            self._disk_key = self._current_key()
+        except Exception as e:
+            if os.getenv("DEBUG"):
+                print(f"Task journal compaction failed: {e}", file=sys.stderr)
+
+    def _flush_loop(self) -> None:
+        while True:
+            if self._durability == "interval":
+                self._dirty.wait(self._fsync_interval)
+                if time.monotonic() - self._last_sync >= self._fsync_interval:
+                    self.sync()
+                if not self._dirty.is_set():
+                    continue
+            else:
+                self._dirty.wait()
+            # Let concurrent writers join the batch before committing it
+            if self._flush_delay > 0:
+                time.sleep(self._flush_delay)
+            if not self.flush():
+                # Back off instead of spinning on a persistently failing disk
+                time.sleep(1.0)
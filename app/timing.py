@@ -0,0 +1,106 @@
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from fastapi.routing import APIRoute
+
+"""
+Per-request phase timers for the Server-Timing header.
+
+The request middleware puts a Timings object in a context variable; code
+anywhere below it (dependencies, endpoints, the route handler) wraps work
+in `with phase("name"):` and the durations are summed per name. When no
+Timings is active, phase() costs one context variable lookup.
+
+Phases used by the app:
+  ratelimit   fastapi-limiter check
+  db_acquire  checking a connection out of the SQLAlchemy pool (get_db)
+  query       SQL statements and commit, or the file store op and its flush
+  log         log_event calls made by the endpoint
+  serialize   response_model validation and JSON encoding (TimedRoute)
+"""
+
+_current: ContextVar[Optional["Timings"]] = ContextVar("server_timing", default=None)
+
+
+class Timings:
+    def __init__(self) -> None:
+        self.phases: Dict[str, float] = {}
+        self.endpoint_end: Optional[float] = None
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def as_ms(self) -> Dict[str, float]:
+        return {name: round(s * 1000, 3) for name, s in self.phases.items()}
+
+    def header(self, total: Optional[float] = None) -> str:
+        parts = [f"{name};dur={ms}" for name, ms in self.as_ms().items()]
+        if total is not None:
+            parts.append(f"total;dur={round(total * 1000, 3)}")
+        return ", ".join(parts)
+
+
+def start() -> "Timings":
+    """Begin timing the current request; returns the Timings to read later."""
+    timings = Timings()
+    _current.set(timings)
+    return timings
+
+
+class phase:
+    """Context manager adding the elapsed time to the current request's phase `name`."""
+
+    __slots__ = ("_name", "_timings", "_start")
+
+    def __init__(self, name: str):
+        self._name = name
+        self._timings = _current.get()
+
+    def __enter__(self) -> "phase":
+        if self._timings is not None:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        if self._timings is not None:
+            self._timings.add(self._name, time.perf_counter() - self._start)
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that records the serialize phase.
+
+    Async endpoints are wrapped to note when they return; the time from
+    there until the route handler has built the response is response
+    model validation plus JSON encoding.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = _note_return(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            timings = _current.get()
+            if timings is not None and timings.endpoint_end is not None:
+                timings.add("serialize", time.perf_counter() - timings.endpoint_end)
+            return response
+
+        return timed_handler
+
+
+def _note_return(endpoint):
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            timings = _current.get()
+            if timings is not None:
+                timings.endpoint_end = time.perf_counter()
+    return wrapper
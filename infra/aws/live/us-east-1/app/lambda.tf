@@ -15,6 +15,8 @@ resource "aws_lambda_function" "api" {
   environment {
     variables = {
       TASKS_FILE    = "/tmp/tasks.json"
+      # /tmp does not outlive the execution environment, so skip fsync
+      TASKS_DURABILITY = "none"
       # Prefer explicit value; otherwise automatically allow the CloudFront domain
       ALLOW_ORIGINS = var.allow_origins != "" ? var.allow_origins : "https://${aws_cloudfront_distribution.cdn.domain_name}"
       # Splunk HEC configuration (optional)
@@ -26,6 +28,8 @@ resource "aws_lambda_function" "api" {
       SPLUNK_SOURCE     = var.splunk_source
       SPLUNK_SOURCETYPE = var.splunk_sourcetype
       SPLUNK_ENABLE     = var.splunk_enable
+      # "emf" writes metrics to stdout for CloudWatch instead of posting to HEC
+      LOG_SINK          = var.log_sink
     }
   }
 
@@ -89,6 +89,12 @@ variable "splunk_enable" {
   default     = "1"
 }
 
+variable "log_sink" {
+  type        = string
+  description = "Where app events go: 'hec' (Splunk), 'emf' (CloudWatch Embedded Metric Format on stdout) or 'both'"
+  default     = "hec"
+}
+
 # Optionally source the HEC token from AWS Secrets Manager instead of a plain var
 variable "splunk_hec_secret_arn" {
   type        = string
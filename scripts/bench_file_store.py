@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Throughput of the file-mode task store per layout and durability mode.
+
+Each configuration runs in a fresh process (the store is configured from
+environment variables at import time) against a scratch TASKS_FILE that is
+preloaded with --preload tasks. --concurrency writers then issue --writes
+updates in total, awaiting each commit exactly like the endpoints do.
+
+Usage:
+  python scripts/bench_file_store.py [--dir /tmp] [--preload 1000] [--writes 2000] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+LAYOUTS = ("snapshot", "journal")
+MODES = ("none", "interval", "always")
+
+
+def _child(args: argparse.Namespace) -> None:
+    sys.path.insert(0, str(ROOT / "app"))
+    import main  # type: ignore
+
+    store = main._task_store
+    store.ensure_loaded()
+    latencies: list[float] = []
+
+    async def writer(ids: list[int]) -> None:
+        for i in ids:
+            t0 = time.perf_counter()
+            commit = store.update(main.Task(id=i, title=f"task {i} updated", completed=True))
+            await asyncio.wrap_future(commit)
+            latencies.append(time.perf_counter() - t0)
+
+    async def run() -> float:
+        ids = [i % args.preload for i in range(args.writes)]
+        chunks = [ids[n::args.concurrency] for n in range(args.concurrency)]
+        t0 = time.perf_counter()
+        await asyncio.gather(*(writer(c) for c in chunks))
+        return time.perf_counter() - t0
+
+    elapsed = asyncio.run(run())
+    store.flush()
+    store.sync()
+    latencies.sort()
+    print(json.dumps({
+        "ops_per_sec": round(args.writes / elapsed),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+    }))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dir", default=tempfile.gettempdir(), help="directory for the scratch task file")
+    ap.add_argument("--preload", type=int, default=1000)
+    ap.add_argument("--writes", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        _child(args)
+        return
+
+    print(f"preload={args.preload} writes={args.writes} concurrency={args.concurrency} dir={args.dir}")
+    print(f"{'layout':<10}{'durability':<12}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for layout in LAYOUTS:
+        for mode in MODES:
+            with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+                tasks_file = Path(tmp) / "tasks.json"
+                seed = [{"id": i, "title": f"task {i}", "completed": False} for i in range(args.preload)]
+                tasks_file.write_text(json.dumps(seed), encoding="utf-8")
+                env = {
+                    **os.environ,
+                    "TASKS_FILE": str(tasks_file),
+                    "TASKS_JOURNAL": "1" if layout == "journal" else "0",
+                    "TASKS_DURABILITY": mode,
+                    "TASKS_SHARED": "0",
+                }
+                env.pop("DATABASE_URL", None)
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", "--preload", str(args.preload),
+                     "--writes", str(args.writes), "--concurrency", str(args.concurrency)],
+                    env=env, check=True, capture_output=True, text=True,
+                )
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                print(f"{layout:<10}{mode:<12}{r['ops_per_sec']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Events/sec delivered to HEC by app/logging_splunk.py, against the local stub.
+
+Rows:
+  urlopen/event   the previous client: one urllib POST (new connection) per event
+  new conn        batched shipper, SPLUNK_POOL_SIZE=0 (connection closed after each POST)
+  keep-alive      batched shipper reusing pooled connections
+  keep-alive+gz   same, with SPLUNK_GZIP=1
+
+Each shipper row runs in a fresh process (logging_splunk reads its settings
+at import), logs --events events and times until flush() returns. The stub
+runs in this process and counts the TCP connections it accepted.
+
+Usage:
+  python scripts/bench_hec.py [--events 20000] [--batch 1,100] [--latency-ms 0]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import hec_stub  # noqa: E402
+
+TOKEN = "bench"
+
+
+def _child(args: argparse.Namespace) -> None:
+    sys.path.insert(0, str(ROOT / "app"))
+    if args.mode == "urlopen":
+        url = os.environ["SPLUNK_HEC_URL"] + "/services/collector/event"
+        t0 = time.perf_counter()
+        for i in range(args.events):
+            data = json.dumps({"time": int(time.time()), "source": "fastapi", "sourcetype": "_json",
+                               "event": {"type": "bench", "i": i}}).encode("utf-8")
+            req = urllib.request.Request(url, data=data, method="POST")
+            req.add_header("Authorization", f"Splunk {TOKEN}")
+            req.add_header("Content-Type", "application/json")
+            urllib.request.urlopen(req, timeout=1.0).read()
+        elapsed = time.perf_counter() - t0
+        print(json.dumps({"elapsed": elapsed, "enqueue_ms": None}))
+        return
+
+    import logging_splunk  # type: ignore
+
+    t0 = time.perf_counter()
+    for i in range(args.events):
+        logging_splunk.log_event("bench", {"i": i})
+    enqueued = time.perf_counter() - t0
+    assert logging_splunk.flush(timeout=300), "flush timed out"
+    elapsed = time.perf_counter() - t0
+    stats = logging_splunk.stats()
+    assert stats["dropped"] == 0 and stats["failed"] == 0, stats
+    print(json.dumps({"elapsed": elapsed, "enqueue_ms": round(enqueued * 1000, 1)}))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--events", type=int, default=20000)
+    ap.add_argument("--batch", default="1,100", help="SPLUNK_BATCH_MAX values to run")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="stub response delay (simulated RTT)")
+    ap.add_argument("--mode", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.mode:
+        _child(args)
+        return
+
+    server, stats = hec_stub.serve(0, TOKEN, args.latency_ms)
+    base_env = {
+        **os.environ,
+        "SPLUNK_HEC_URL": f"http://127.0.0.1:{server.server_address[1]}",
+        "SPLUNK_HEC_TOKEN": TOKEN,
+        "SPLUNK_QUEUE_MAX": str(args.events),
+        "SPLUNK_FLUSH_MS": "50",
+    }
+    runs = [("urlopen/event", "urlopen", 1, {})]
+    for batch in (int(b) for b in args.batch.split(",")):
+        runs += [
+            ("new conn", "ship", batch, {"SPLUNK_POOL_SIZE": "0"}),
+            ("keep-alive", "ship", batch, {"SPLUNK_POOL_SIZE": "2"}),
+            ("keep-alive+gz", "ship", batch, {"SPLUNK_POOL_SIZE": "2", "SPLUNK_GZIP": "1"}),
+        ]
+
+    print(f"events={args.events} stub latency={args.latency_ms}ms")
+    print(f"{'client':<16}{'batch':>6}{'events/s':>11}{'conns':>8}{'posts':>8}{'enqueue ms':>12}")
+    for label, mode, batch, extra in runs:
+        env = {**base_env, "SPLUNK_BATCH_MAX": str(batch), **extra}
+        before = stats.snapshot()
+        out = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--events", str(args.events)],
+            env=env, check=True, capture_output=True, text=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        after = stats.snapshot()
+        assert after["events"] - before["events"] == args.events, (before, after)
+        enqueue = "-" if r["enqueue_ms"] is None else r["enqueue_ms"]
+        print(f"{label:<16}{batch:>6}{round(args.events / r['elapsed']):>11}"
+              f"{after['connections'] - before['connections']:>8}{after['requests'] - before['requests']:>8}{enqueue:>12}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+GET /health tail latency while file-mode writes saturate the server.
+
+Two uvicorn servers share one TASKS_FILE in shared mode (TASKS_SHARED=1),
+preloaded with --preload tasks. --writers clients keep PUTting tasks to both
+servers, so server A has to reload the file whenever B has written it. A
+prober meanwhile sends GET /health to A every 10ms. Each run is repeated
+with IO_WORKERS=0 (store calls inline on the event loop, the old behaviour)
+and with the bounded I/O pool.
+
+Usage:
+  python scripts/bench_loop_lag.py [--preload 50000] [--seconds 10] [--writers 8] [--io-workers 4] [--journal]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _start(port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT / "app", env=env,
+    )
+
+
+async def _wait_ready(url: str) -> None:
+    async with httpx.AsyncClient() as c:
+        for _ in range(200):
+            try:
+                if (await c.get(f"{url}/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"{url} did not start")
+
+
+def _pct(samples: list, q: float) -> float:
+    return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 2)
+
+
+async def _drive(a: str, b: str, args: argparse.Namespace) -> dict:
+    stop = time.perf_counter() + args.seconds
+    health: list = []
+    writes = 0
+
+    async def writer(n: int, base: str) -> None:
+        nonlocal writes
+        async with httpx.AsyncClient(base_url=base, timeout=60) as c:
+            i = n
+            while time.perf_counter() < stop:
+                task_id = i % args.preload + 1
+                r = await c.put(f"/tasks/{task_id}", json={"id": task_id, "title": f"w{i}", "completed": True})
+                assert r.status_code == 200, r.text
+                writes += 1
+                i += args.writers
+
+    async def prober() -> None:
+        async with httpx.AsyncClient(base_url=a, timeout=60) as c:
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                await c.get("/health")
+                health.append(time.perf_counter() - t0)
+                await asyncio.sleep(0.01)
+
+    await asyncio.gather(prober(), *(writer(n, a if n % 2 else b) for n in range(args.writers)))
+    health.sort()
+    return {"p50": _pct(health, 0.5), "p99": _pct(health, 0.99), "max": round(health[-1] * 1000, 2),
+            "writes_per_s": round(writes / args.seconds)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--preload", type=int, default=50000)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--writers", type=int, default=8)
+    ap.add_argument("--io-workers", type=int, default=4)
+    ap.add_argument("--journal", action="store_true", help="use the snapshot + journal layout (TASKS_JOURNAL=1)")
+    ap.add_argument("--port", type=int, default=8761)
+    args = ap.parse_args()
+
+    print(f"preload={args.preload} writers={args.writers} seconds={args.seconds} journal={args.journal}")
+    print(f"{'IO_WORKERS':<12}{'health p50':>12}{'p99':>10}{'max':>10}{'writes/s':>10}")
+    for workers in (0, args.io_workers):
+        with tempfile.TemporaryDirectory() as tmp:
+            tasks_file = Path(tmp) / "tasks.json"
+            seed = [{"id": i, "title": f"task {i}", "completed": False} for i in range(1, args.preload + 1)]
+            tasks_file.write_text(json.dumps(seed), encoding="utf-8")
+            env = {**os.environ, "TASKS_FILE": str(tasks_file), "TASKS_SHARED": "1", "TASKS_JOURNAL": "1" if args.journal else "0",
+                   "IO_WORKERS": str(workers)}
+            env.pop("DATABASE_URL", None)
+            a, b = f"http://127.0.0.1:{args.port}", f"http://127.0.0.1:{args.port + 1}"
+            procs = [_start(args.port, env), _start(args.port + 1, env)]
+            try:
+                asyncio.run(_wait_ready(a))
+                asyncio.run(_wait_ready(b))
+                r = asyncio.run(_drive(a, b, args))
+            finally:
+                for p in procs:
+                    p.terminate()
+                    p.wait()
+            print(f"{workers:<12}{r['p50']:>12}{r['p99']:>10}{r['max']:>10}{r['writes_per_s']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Requests/sec through the app with the plain ASGI RequestLogger versus the
+previous @app.middleware("http") request_logger (BaseHTTPMiddleware).
+
+Each configuration runs in a fresh process so the app reads its env once.
+Requests are sent straight into the ASGI app (no server or socket), so the
+numbers isolate the middleware stack. "logging on" ships http_request
+events to a local HEC stub (scripts/hec_stub.py); "off" leaves
+ENABLE_SPLUNK_LOGGING unset.
+
+Usage:
+  python scripts/bench_middleware.py [--requests 20000] [--path /health]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import hec_stub  # noqa: E402
+
+TOKEN = "bench"
+
+
+def _legacy_app(main):
+    """main.app with RequestLogger swapped for the old BaseHTTPMiddleware function."""
+    from starlette.middleware import Middleware
+    from starlette.middleware.base import BaseHTTPMiddleware
+
+    async def request_logger(request, call_next):
+        start = time.perf_counter()
+        timings = main.timing.start() if main._SERVER_TIMING else None
+        if main._PROMETHEUS:
+            main._http_in_flight.inc()
+        try:
+            response = await call_next(request)
+        finally:
+            if main._PROMETHEUS:
+                main._http_in_flight.dec()
+        latency_ms = round((time.perf_counter() - start) * 1000, 2)
+        route = getattr(request.scope.get("route"), "path", None)
+        if timings is not None:
+            response.headers["Server-Timing"] = timings.header(total=latency_ms / 1000)
+            response.headers["Timing-Allow-Origin"] = "*"
+        if main._PROMETHEUS:
+            main._http_latency.observe(latency_ms / 1000, method=main.method_label(request.method),
+                                       route=route or "unmatched", status=response.status_code)
+        if os.getenv("ENABLE_SPLUNK_LOGGING") == "1":
+            weight = main.sample_weight(route or request.url.path, response.status_code, latency_ms)
+            if weight is not None:
+                main.log_event("http_request", {
+                    "method": request.method,
+                    "path": request.url.path,
+                    "route": route,
+                    "status": response.status_code,
+                    "user_agent": request.headers.get("user-agent"),
+                    "client_ip": request.headers.get("x-forwarded-for", request.client.host if request.client else None),
+                    "latency_ms": latency_ms,
+                    "sample_weight": weight,
+                })
+        return response
+
+    app = main.app
+    app.user_middleware = [
+        Middleware(BaseHTTPMiddleware, dispatch=request_logger) if m.cls is main.RequestLogger else m
+        for m in app.user_middleware
+    ]
+    app.middleware_stack = None
+    return app
+
+
+async def _run(app, path: str, n: int) -> float:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"user-agent", b"bench")],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+    }
+
+    def make_receive():
+        sent = False
+
+        async def receive():
+            # Like a server: the body once, then wait (here forever) for a disconnect
+            nonlocal sent
+            if sent:
+                await asyncio.Event().wait()
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return receive
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message
+
+    for _ in range(min(n, 500)):  # warm up
+        await app(dict(scope), make_receive(), send)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), make_receive(), send)
+    return n / (time.perf_counter() - t0)
+
+
+def _child(args: argparse.Namespace) -> None:
+    sys.path.insert(0, str(ROOT / "app"))
+    import main  # type: ignore
+
+    app = _legacy_app(main) if args.variant == "legacy" else main.app
+    print(json.dumps({"rps": asyncio.run(_run(app, args.path, args.requests))}))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=20000)
+    ap.add_argument("--path", default="/health")
+    ap.add_argument("--variant", choices=("asgi", "legacy"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.variant:
+        _child(args)
+        return
+
+    server, _stats = hec_stub.serve(0, TOKEN, 0)
+    print(f"requests={args.requests} path={args.path}")
+    print(f"{'logging':<10}{'BaseHTTPMiddleware':>20}{'ASGI':>10}{'speedup':>10}")
+    for logging_on in (False, True):
+        rps = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, "TASKS_FILE": str(Path(tmp) / "tasks.json")}
+            env.pop("DATABASE_URL", None)
+            if logging_on:
+                env.update({
+                    "ENABLE_SPLUNK_LOGGING": "1",
+                    "SPLUNK_HEC_URL": f"http://127.0.0.1:{server.server_address[1]}",
+                    "SPLUNK_HEC_TOKEN": TOKEN,
+                    "SPLUNK_QUEUE_MAX": str(args.requests * 2),
+                })
+            else:
+                env.pop("ENABLE_SPLUNK_LOGGING", None)
+            for variant in ("legacy", "asgi"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--variant", variant, "--requests", str(args.requests), "--path", args.path],
+                    env=env, check=True, capture_output=True, text=True,
+                )
+                rps[variant] = json.loads(out.stdout.strip().splitlines()[-1])["rps"]
+        label = "on" if logging_on else "off"
+        print(f"{label:<10}{rps['legacy']:>20.0f}{rps['asgi']:>10.0f}{rps['asgi'] / rps['legacy']:>9.2f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
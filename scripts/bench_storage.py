@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Compare the JSON file store with the embedded SQLite backend at 10k-1M tasks.
+
+Every (backend, size) pair runs in a fresh process with the app configured
+from environment variables, seeded directly on disk, and then driven in
+process through the ASGI app (httpx.ASGITransport), so numbers include
+routing and serialization but no sockets.
+
+Measured per pair:
+  cold ms    first GET /tasks/{id} after startup (file mode loads the file)
+  get p50    point reads of random ids
+  put p50    sequential updates, each awaited until durable
+  list ms    one GET /tasks/ of the whole table
+
+Usage:
+  python scripts/bench_storage.py [--sizes 10000,100000,1000000] [--reads 2000] [--writes 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKENDS = ("file", "file-journal", "sqlite")
+
+
+def _seed_file(path: Path, n: int) -> None:
+    rows = [{"id": i, "title": f"task {i}", "completed": i % 3 == 0} for i in range(1, n + 1)]
+    path.write_text(json.dumps(rows, indent=2), encoding="utf-8")
+
+
+def _seed_sqlite(path: Path, n: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO todos (id, title, completed) VALUES (?, ?, ?)",
+        ((i, f"task {i}", i % 3 == 0) for i in range(1, n + 1)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def _p50(samples: list[float]) -> float:
+    samples.sort()
+    return round(samples[len(samples) // 2] * 1000, 3)
+
+
+def _child(args: argparse.Namespace) -> None:
+    sys.path.insert(0, str(ROOT / "app"))
+    import httpx
+    import main  # type: ignore
+
+    n = args.size
+
+    async def run() -> dict:
+        if args.backend == "sqlite":
+            # Let the app create the schema, then bulk-load outside of it
+            await main._load_on_startup()
+            _seed_sqlite(Path(os.environ["DATABASE_URL"].split("///", 1)[1]), n)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+            t0 = time.perf_counter()
+            r = await c.get(f"/tasks/{n // 2}")
+            cold = time.perf_counter() - t0
+            assert r.status_code == 200, r.text
+
+            reads = []
+            for _ in range(args.reads):
+                i = random.randint(1, n)
+                t0 = time.perf_counter()
+                await c.get(f"/tasks/{i}")
+                reads.append(time.perf_counter() - t0)
+
+            writes = []
+            for _ in range(args.writes):
+                i = random.randint(1, n)
+                t0 = time.perf_counter()
+                r = await c.put(f"/tasks/{i}", json={"id": i, "title": f"task {i} edited", "completed": True})
+                writes.append(time.perf_counter() - t0)
+                assert r.status_code == 200, r.text
+
+            t0 = time.perf_counter()
+            r = await c.get("/tasks/")
+            listed = time.perf_counter() - t0
+            assert len(r.json()) == n
+        return {
+            "cold_ms": round(cold * 1000, 1),
+            "get_p50_ms": _p50(reads),
+            "put_p50_ms": _p50(writes),
+            "list_ms": round(listed * 1000, 1),
+        }
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="10000,100000,1000000")
+    ap.add_argument("--reads", type=int, default=2000)
+    ap.add_argument("--writes", type=int, default=20)
+    ap.add_argument("--dir", default=tempfile.gettempdir())
+    ap.add_argument("--backend", help=argparse.SUPPRESS)
+    ap.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.backend:
+        _child(args)
+        return
+
+    print(f"reads={args.reads} writes={args.writes} dir={args.dir}")
+    print(f"{'backend':<14}{'tasks':>9}{'cold ms':>10}{'get p50':>10}{'put p50':>10}{'list ms':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        for backend in BACKENDS:
+            with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+                env = {k: v for k, v in os.environ.items() if k not in ("DATABASE_URL", "TASKS_JOURNAL")}
+                if backend == "sqlite":
+                    env["DATABASE_URL"] = f"sqlite:///{tmp}/tasks.db"
+                else:
+                    tasks_file = Path(tmp) / "tasks.json"
+                    _seed_file(tasks_file, size)
+                    env["TASKS_FILE"] = str(tasks_file)
+                    env["TASKS_JOURNAL"] = "1" if backend == "file-journal" else "0"
+                out = subprocess.run(
+                    [sys.executable, __file__, "--backend", backend, "--size", str(size),
+                     "--reads", str(args.reads), "--writes", str(args.writes)],
+                    env=env, check=True, capture_output=True, text=True,
+                )
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                print(f"{backend:<14}{size:>9}{r['cold_ms']:>10}{r['get_p50_ms']:>10}{r['put_p50_ms']:>10}{r['list_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
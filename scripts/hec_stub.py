@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Minimal local stand-in for a Splunk HTTP Event Collector.
+
+Accepts POST /services/collector/event (plain or gzip bodies, several events
+concatenated per request), checks the "Authorization: Splunk <token>" header
+and counts requests, events and new connections. Speaks HTTP/1.1 keep-alive
+so connection reuse by the client is visible in the counters.
+
+Usage:
+  python scripts/hec_stub.py [--port 8088] [--token dev] [--latency-ms 0]
+  SPLUNK_HEC_URL=http://127.0.0.1:8088 SPLUNK_HEC_TOKEN=dev uvicorn main:app
+"""
+import argparse
+import gzip
+import http.server
+import json
+import threading
+import time
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.events = 0
+        self.connections = 0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "events": self.events, "connections": self.connections}
+
+
+def make_handler(stats: Stats, token: str, latency: float = 0.0):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # One write per response, sent immediately (keep-alive clients
+        # otherwise wait out delayed ACKs)
+        disable_nagle_algorithm = True
+        wbufsize = -1
+
+        def setup(self) -> None:
+            super().setup()
+            with stats.lock:
+                stats.connections += 1
+
+        def do_POST(self) -> None:
+            body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+            if self.headers.get("Authorization") != f"Splunk {token}":
+                return self._reply(401, {"text": "Invalid token", "code": 4})
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            # Events are concatenated JSON objects, optionally newline separated
+            decoder, text, pos, n = json.JSONDecoder(), body.decode("utf-8"), 0, 0
+            while pos < len(text):
+                while pos < len(text) and text[pos].isspace():
+                    pos += 1
+                if pos == len(text):
+                    break
+                _, pos = decoder.raw_decode(text, pos)
+                n += 1
+            if latency:
+                time.sleep(latency)
+            with stats.lock:
+                stats.requests += 1
+                stats.events += n
+            self._reply(200, {"text": "Success", "code": 0})
+
+        def _reply(self, status: int, obj: dict) -> None:
+            data = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *_args) -> None:
+            pass
+
+    return Handler
+
+
+def serve(port: int = 0, token: str = "dev", latency_ms: float = 0.0):
+    """Start the stub on a background thread. Returns (server, stats)."""
+    stats = Stats()
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), make_handler(stats, token, latency_ms / 1000.0))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8088)
+    ap.add_argument("--token", default="dev")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every response")
+    args = ap.parse_args()
+    server, stats = serve(args.port, args.token, args.latency_ms)
+    print(f"HEC stub on http://127.0.0.1:{server.server_address[1]} (token {args.token!r})")
+    try:
+        while True:
+            time.sleep(5)
+            print(stats.snapshot())
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Drive the Lambda `handler` in app/main.py with synthetic API Gateway v2
+(HTTP API) events and check that every Splunk event reaches HEC.
+
+A local HEC stub (scripts/hec_stub.py) receives the events. For each
+--every value a fresh process runs with SPLUNK_FLUSH_EVERY set, calls
+handler() --invocations times with a mix of health, create, read, update
+and delete requests, and reports invocation latency, HEC posts and the
+largest number of events left queued after an invocation returned (what a
+reclaimed sandbox would lose). The run fails if any event is missing once
+the process exits.
+
+Usage:
+  python scripts/lambda_harness.py [--invocations 500] [--every 1,10,50] [--latency-ms 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "scripts"))
+import hec_stub  # noqa: E402
+
+TOKEN = "harness"
+
+
+class FakeContext:
+    """The parts of the Lambda context object the app and Mangum touch."""
+
+    function_name = "todo-api-harness"
+    memory_limit_in_mb = 512
+    aws_request_id = "harness"
+
+    def __init__(self, timeout_ms: int):
+        self._deadline = time.monotonic() + timeout_ms / 1000.0
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def api_gw_v2_event(method: str, path: str, body=None, query: str = "") -> dict:
+    now = time.time()
+    return {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": path,
+        "rawQueryString": query,
+        "headers": {
+            "content-type": "application/json",
+            "host": "harness.execute-api.us-east-1.amazonaws.com",
+            "user-agent": "lambda-harness",
+            "x-forwarded-for": "203.0.113.10",
+        },
+        "requestContext": {
+            "accountId": "123456789012",
+            "apiId": "harness",
+            "domainName": "harness.execute-api.us-east-1.amazonaws.com",
+            "domainPrefix": "harness",
+            "http": {
+                "method": method,
+                "path": path,
+                "protocol": "HTTP/1.1",
+                "sourceIp": "203.0.113.10",
+                "userAgent": "lambda-harness",
+            },
+            "requestId": f"req-{now}",
+            "routeKey": "$default",
+            "stage": "$default",
+            "time": time.strftime("%d/%b/%Y:%H:%M:%S +0000", time.gmtime(now)),
+            "timeEpoch": int(now * 1000),
+        },
+        "body": json.dumps(body) if body is not None else None,
+        "isBase64Encoded": False,
+    }
+
+
+def _requests(n: int):
+    """Cycle health / create / get / update / delete; yields (event, expected status)."""
+    for i in range(n):
+        task_id = i // 5 + 1
+        step = i % 5
+        if step == 0:
+            yield api_gw_v2_event("GET", "/health"), 200
+        elif step == 1:
+            yield api_gw_v2_event("POST", "/tasks/", {"id": task_id, "title": f"task {task_id}"}), 200
+        elif step == 2:
+            yield api_gw_v2_event("GET", f"/tasks/{task_id}"), 200
+        elif step == 3:
+            yield api_gw_v2_event("PUT", f"/tasks/{task_id}", {"id": task_id, "title": "done", "completed": True}), 200
+        else:
+            yield api_gw_v2_event("DELETE", f"/tasks/{task_id}"), 200
+
+
+def _child(args: argparse.Namespace) -> None:
+    sys.path.insert(0, str(ROOT / "app"))
+    import logging_splunk  # type: ignore
+    import main  # type: ignore
+
+    latencies, at_risk = [], 0
+    for event, expected in _requests(args.invocations):
+        t0 = time.perf_counter()
+        resp = main.handler(event, FakeContext(timeout_ms=30000))
+        latencies.append(time.perf_counter() - t0)
+        assert resp["statusCode"] == expected, resp
+        at_risk = max(at_risk, logging_splunk.stats()["queued"])
+    latencies.sort()
+    print(json.dumps({
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+        "max_queued": at_risk,
+        "stats": logging_splunk.stats(),
+    }))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--invocations", type=int, default=500)
+    ap.add_argument("--every", default="1,10,50", help="SPLUNK_FLUSH_EVERY values to run")
+    ap.add_argument("--latency-ms", type=float, default=5.0, help="stub HEC response delay")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        _child(args)
+        return
+
+    server, stats = hec_stub.serve(0, TOKEN, args.latency_ms)
+    # Each request logs http_request from the middleware; writes add one more
+    expected_events = args.invocations + sum(1 for i in range(args.invocations) if i % 5 in (1, 3, 4))
+    print(f"invocations={args.invocations} stub latency={args.latency_ms}ms expected events={expected_events}")
+    print(f"{'every':>6}{'p50 ms':>9}{'p99 ms':>9}{'posts':>7}{'events':>8}{'max queued':>12}")
+    ok = True
+    for every in (int(e) for e in args.every.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                "ENABLE_MANGUM": "1",
+                "ENABLE_SPLUNK_LOGGING": "1",
+                "SPLUNK_HEC_URL": f"http://127.0.0.1:{server.server_address[1]}",
+                "SPLUNK_HEC_TOKEN": TOKEN,
+                "SPLUNK_FLUSH_EVERY": str(every),
+                "TASKS_FILE": str(Path(tmp) / "tasks.json"),
+            }
+            env.pop("DATABASE_URL", None)
+            before = stats.snapshot()
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", "--invocations", str(args.invocations)],
+                env=env, check=True, capture_output=True, text=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            after = stats.snapshot()
+            delivered = after["events"] - before["events"]
+            ok &= delivered == expected_events
+            print(f"{every:>6}{r['p50_ms']:>9}{r['p99_ms']:>9}{after['requests'] - before['requests']:>7}"
+                  f"{delivered:>8}{r['max_queued']:>12}")
+    server.shutdown()
+    if not ok:
+        sys.exit("events were lost")
+
+
+if __name__ == "__main__":
+    main()
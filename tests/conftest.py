@@ -0,0 +1,33 @@
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# The app modules import each other by plain name when not run as a package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+
+@pytest.fixture
+def make_client(tmp_path, monkeypatch):
+    clients = []
+
+    def make(**env):
+        monkeypatch.delenv("DATABASE_URL", raising=False)
+        monkeypatch.delenv("REDIS_URL", raising=False)
+        monkeypatch.setenv("TASKS_FILE", str(tmp_path / "tasks.json"))
+        monkeypatch.setenv("TASKS_FLUSH_DELAY_MS", "0")
+        for k, v in env.items():
+            monkeypatch.setenv(k, v)
+        sys.modules.pop("main", None)
+        sys.modules.pop("logging_splunk", None)  # reads its env at import too
+        client = TestClient(importlib.import_module("main").app)
+        client.__enter__()
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.__exit__(None, None, None)
+    sys.modules.pop("main", None)
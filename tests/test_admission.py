@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+from admission import AdmissionControl, Limiter
+
+
+def test_admits_up_to_limit_then_sheds_when_queue_full():
+    async def run():
+        lim = Limiter(2, queue_size=0)
+        assert await lim.acquire()
+        assert await lim.acquire()
+        assert not await lim.acquire()
+        assert lim.in_flight == 2
+        assert lim.shed == {"queue_full": 1, "timeout": 0}
+    asyncio.run(run())
+
+
+def test_release_hands_slot_to_oldest_waiter():
+    async def run():
+        lim = Limiter(1, queue_size=2, queue_timeout=5)
+        assert await lim.acquire()
+        order = []
+
+        async def waiter(name):
+            assert await lim.acquire()
+            order.append(name)
+
+        tasks = [asyncio.create_task(waiter("b")), asyncio.create_task(waiter("c"))]
+        await asyncio.sleep(0)
+        assert lim.queued == 2
+        lim.release()
+        await asyncio.sleep(0)
+        assert order == ["b"] and lim.in_flight == 1 and lim.queued == 1
+        lim.release()
+        await asyncio.gather(*tasks)
+        assert order == ["b", "c"] and lim.in_flight == 1
+        lim.release()
+        assert lim.in_flight == 0
+    asyncio.run(run())
+
+
+def test_queued_request_times_out():
+    async def run():
+        lim = Limiter(1, queue_size=1, queue_timeout=0.02)
+        assert await lim.acquire()
+        assert not await lim.acquire()
+        assert lim.shed == {"queue_full": 0, "timeout": 1}
+        assert lim.queued == 0 and lim.in_flight == 1
+    asyncio.run(run())
+
+
+def test_cancel_while_queued_leaves_the_queue():
+    async def run():
+        lim = Limiter(1, queue_size=1, queue_timeout=5)
+        assert await lim.acquire()
+        task = asyncio.create_task(lim.acquire())
+        await asyncio.sleep(0)
+        assert lim.queued == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert lim.queued == 0 and lim.in_flight == 1
+        lim.release()
+        assert lim.in_flight == 0
+    asyncio.run(run())
+
+
+def test_cancel_after_handover_passes_the_slot_on():
+    async def run():
+        lim = Limiter(1, queue_size=2, queue_timeout=5)
+        assert await lim.acquire()
+        b = asyncio.create_task(lim.acquire())
+        c = asyncio.create_task(lim.acquire())
+        await asyncio.sleep(0)
+        lim.release()  # slot handed to b, which has not resumed yet
+        b.cancel()
+        await asyncio.gather(b, return_exceptions=True)
+        assert await c  # b's slot went to c instead of leaking
+        assert lim.in_flight == 1 and lim.queued == 0
+        lim.release()
+        assert lim.in_flight == 0
+    asyncio.run(run())
+
+
+async def _call(app, path):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({"type": "http", "path": path}, receive, send)
+    return sent
+
+
+def test_middleware_rejects_with_503_and_exempts_health():
+    async def run():
+        gate = asyncio.Event()
+
+        async def inner(scope, receive, send):
+            if scope["path"] == "/slow":
+                await gate.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        app = AdmissionControl(inner, Limiter(1), retry_after=3)
+        slow = asyncio.create_task(_call(app, "/slow"))
+        await asyncio.sleep(0)
+
+        start, body = await _call(app, "/tasks/")
+        assert start["status"] == 503
+        assert (b"retry-after", b"3") in start["headers"]
+        assert json.loads(body["body"]) == {"detail": "Server is overloaded, retry later"}
+
+        start, _ = await _call(app, "/health")
+        assert start["status"] == 200
+
+        gate.set()
+        assert (await slow)[0]["status"] == 200
+        assert app.limiter.in_flight == 0
+    asyncio.run(run())
@@ -0,0 +1,59 @@
+import pytest
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def client(request, make_client, tmp_path):
+    if request.param == "sqlite":
+        return make_client(DATABASE_URL=f"sqlite:///{tmp_path / 'tasks.db'}")
+    return make_client()
+
+
+def _task(i, title, completed=False):
+    return {"id": i, "title": title, "completed": completed}
+
+
+def _statuses(resp):
+    assert resp.status_code == 200, resp.text
+    return [(r["id"], r["status"]) for r in resp.json()]
+
+
+def _titles(client):
+    return {t["id"]: (t["title"], t["completed"]) for t in client.get("/tasks/").json()}
+
+
+def test_create_batch_rejects_existing_and_repeated_ids(client):
+    assert client.post("/tasks/", json=_task(1, "existing")).status_code == 200
+    resp = client.post("/tasks/batch", json=[_task(1, "dup of existing"), _task(2, "first"), _task(2, "repeat"), _task(3, "new")])
+    assert _statuses(resp) == [(1, 400), (2, 201), (2, 400), (3, 201)]
+    assert resp.json()[0]["detail"] == "Task with this ID already exists"
+    assert _titles(client) == {1: ("existing", False), 2: ("first", False), 3: ("new", False)}
+
+
+def test_update_batch_last_value_wins_and_missing_is_404(client):
+    client.post("/tasks/batch", json=[_task(1, "a"), _task(2, "b")])
+    resp = client.put("/tasks/batch", json=[_task(1, "a1"), _task(9, "missing"), _task(1, "a2", True), _task(2, "b1")])
+    assert _statuses(resp) == [(1, 200), (9, 404), (1, 200), (2, 200)]
+    assert _titles(client) == {1: ("a2", True), 2: ("b1", False)}
+    assert client.get("/tasks/1").json() == _task(1, "a2", True)
+
+
+def test_delete_batch_counts_a_repeated_id_once(client):
+    client.post("/tasks/batch", json=[_task(1, "a"), _task(2, "b"), _task(3, "c")])
+    resp = client.request("DELETE", "/tasks/batch", json=[1, 9, 1, 3])
+    assert _statuses(resp) == [(1, 200), (9, 404), (1, 404), (3, 200)]
+    assert _titles(client) == {2: ("b", False)}
+
+
+def test_empty_batches(client):
+    assert client.post("/tasks/batch", json=[]).json() == []
+    assert client.put("/tasks/batch", json=[]).json() == []
+    assert client.request("DELETE", "/tasks/batch", json=[]).json() == []
+
+
+def test_batch_over_1000_items_is_422(client):
+    tasks = [_task(i, str(i)) for i in range(1001)]
+    assert client.post("/tasks/batch", json=tasks).status_code == 422
+    assert client.put("/tasks/batch", json=tasks).status_code == 422
+    assert client.request("DELETE", "/tasks/batch", json=list(range(1001))).status_code == 422
+    assert client.get("/tasks/").json() == []
+    assert _statuses(client.post("/tasks/batch", json=tasks[:1000]))[-1] == (999, 201)
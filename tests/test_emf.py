@@ -0,0 +1,39 @@
+import json
+
+
+def _emf_lines(out):
+    return [json.loads(line) for line in out.splitlines() if line.startswith("{") and '"_aws"' in line]
+
+
+def test_every_request_gets_an_unweighted_emf_line(make_client, capfd):
+    # A zero sample rate drops every fast request from HEC, but not from EMF
+    client = make_client(LOG_SINK="emf", LOG_SAMPLE_RATE="0")
+    capfd.readouterr()
+    for _ in range(5):
+        assert client.get("/health").status_code == 200
+    lines = [r for r in _emf_lines(capfd.readouterr().out) if r["type"] == "http_request"]
+    assert len(lines) == 5
+    for rec in lines:
+        assert rec["requests"] == 1
+        assert "sample_weight" not in rec
+        assert (rec["method"], rec["route"], rec["status"]) == ("GET", "/health", "200")
+
+
+def test_task_write_counts_carry_the_endpoint_dimensions(make_client, capfd):
+    client = make_client(LOG_SINK="emf")
+    client.post("/tasks/", json={"id": 1, "title": "a", "completed": False})
+    client.put("/tasks/1", json={"id": 1, "title": "b", "completed": False})
+    client.post("/tasks/batch", json=[{"id": 2, "title": "c"}, {"id": 1, "title": "dup"}])
+    client.request("DELETE", "/tasks/batch", json=[2])
+    client.delete("/tasks/1")
+    got = [
+        (r["type"], r["method"], r["route"], r["status"], r.get("task_created", r.get("task_updated", r.get("task_deleted"))))
+        for r in _emf_lines(capfd.readouterr().out) if r["type"] != "http_request"
+    ]
+    assert got == [
+        ("task_created", "POST", "/tasks/", "200", 1),
+        ("task_updated", "PUT", "/tasks/{task_id}", "200", 1),
+        ("tasks_batch", "POST", "/tasks/batch", "200", 1),
+        ("tasks_batch", "DELETE", "/tasks/batch", "200", 1),
+        ("task_deleted", "DELETE", "/tasks/{task_id}", "200", 1),
+    ]
@@ -0,0 +1,91 @@
+import http.server
+import threading
+
+import pytest
+
+import logging_splunk
+
+
+class Server:
+    """HEC stand-in whose replies are scripted per request."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = 0
+        self.connections = 0
+        outer = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                outer.connections += 1
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                outer.requests += 1
+                reply = outer.replies.pop(0) if outer.replies else 200
+                if reply == "hang":
+                    threading.Event().wait(1.0)
+                    return
+                self.send_response(503 if reply == 503 else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                # "drop": keep-alive reply, then close as if idle too long
+                self.close_connection = reply == "drop"
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/services/collector/event"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(logging_splunk, "_RETRY_BACKOFF", 0.01)
+    servers = []
+
+    def make(*replies):
+        servers.append(Server(replies))
+        return servers[-1]
+
+    yield make
+    for s in servers:
+        s.close()
+
+
+def test_stale_keepalive_connection_is_retried(server):
+    srv = server("drop", 200)
+    pool = logging_splunk._HecPool(srv.url, 2, 2.0)
+    assert pool.post(b"{}", {})
+    assert pool.post(b"{}", {})
+    assert srv.requests == 2 and srv.connections == 2
+
+
+def test_503_is_retried(server):
+    srv = server(503, 503, 200)
+    pool = logging_splunk._HecPool(srv.url, 2, 2.0)
+    assert pool.post(b"{}", {})
+    assert srv.requests == 3
+
+
+def test_timeout_is_not_retried(server):
+    srv = server("hang")
+    pool = logging_splunk._HecPool(srv.url, 2, 0.2)
+    assert not pool.post(b"{}", {})
+    assert srv.requests == 1
+
+
+def test_refused_connection_is_not_retried(server):
+    srv = server()
+    url = srv.url
+    srv.close()
+    assert not logging_splunk._HecPool(url, 2, 0.5).post(b"{}", {})
@@ -0,0 +1,138 @@
+import json
+import sys
+import time
+
+import pytest
+
+from response_cache import ResponseCache, etag_matches
+
+
+def test_hit_needs_matching_tag():
+    cache = ResponseCache()
+    entry = cache.put("k", 1, b"[]", {"X-Next-Cursor": "5"})
+    assert cache.get("k", 1) is entry
+    assert entry.headers == {"X-Next-Cursor": "5", "ETag": entry.etag}
+    assert cache.get("k", 2) is None
+    assert cache.get("other", 1) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_etag_follows_body():
+    cache = ResponseCache()
+    a = cache.put("a", 0, b'[{"id":1}]')
+    b = cache.put("b", 0, b'[{"id":1}]')
+    c = cache.put("c", 0, b'[{"id":2}]')
+    assert a.etag == b.etag != c.etag
+    assert a.etag.startswith('"') and a.etag.endswith('"')
+
+
+def test_clear_bumps_generation():
+    cache = ResponseCache()
+    cache.put("k", cache.generation, b"[]")
+    cache.clear()
+    assert cache.generation == 1 and len(cache) == 0
+    assert cache.get("k", 0) is None
+
+
+def test_ttl_expiry():
+    cache = ResponseCache(ttl=0.05)
+    cache.put("k", 0, b"[]")
+    assert cache.get("k", 0) is not None
+    time.sleep(0.1)
+    assert cache.get("k", 0) is None
+
+
+def test_evicts_oldest_beyond_max_entries():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", 0, b"1")
+    cache.put("b", 0, b"2")
+    cache.put("a", 0, b"3")  # re-put moves "a" to the back
+    cache.put("c", 0, b"4")
+    assert len(cache) == 2
+    assert cache.get("b", 0) is None
+    assert cache.get("a", 0).body == b"3"
+
+
+def test_evicts_oldest_beyond_max_bytes():
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", 0, b"1234")
+    cache.put("b", 0, b"5678")
+    cache.put("a", 0, b"12")  # replacing an entry releases its old body
+    assert cache.bytes == 6
+    cache.put("c", 0, b"abcdef")
+    assert cache.get("b", 0) is None
+    assert cache.bytes == 8 and len(cache) == 2
+    assert cache.put("big", 0, b"x" * 11).body == b"x" * 11  # too big to keep
+    assert cache.get("big", 0) is None and cache.bytes == 8
+    cache.clear()
+    assert cache.bytes == 0
+
+
+@pytest.mark.parametrize("header,expected", [
+    (None, False),
+    ("", False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", "abc"', True),
+    ('"x"', False),
+    ("*", True),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, '"abc"') is expected
+
+
+def test_write_invalidates_cached_reads(make_client):
+    client = make_client()
+    assert client.post("/tasks/", json={"id": 1, "title": "a", "completed": False}).status_code == 200
+    first = client.get("/tasks/")
+    assert first.json() == [{"id": 1, "title": "a", "completed": False}]
+    etag = first.headers["etag"]
+
+    cached = client.get("/tasks/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.headers["etag"] == etag
+    assert client.get("/tasks/1", headers={"If-None-Match": etag}).status_code == 200
+
+    assert client.put("/tasks/1", json={"id": 1, "title": "b", "completed": True}).status_code == 200
+    fresh = client.get("/tasks/", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.headers["etag"] != etag
+    assert fresh.json()[0]["title"] == "b"
+    assert client.get("/tasks/1").json()["title"] == "b"
+
+    assert client.delete("/tasks/1").status_code == 200
+    assert client.get("/tasks/").json() == []
+    assert client.get("/tasks/1").status_code == 404
+
+
+def test_paged_entry_keeps_next_cursor(make_client):
+    client = make_client()
+    for i in (1, 2, 3):
+        client.post("/tasks/", json={"id": i, "title": str(i), "completed": False})
+    for _ in range(2):  # miss, then hit
+        page = client.get("/tasks/", params={"limit": 2})
+        assert [t["id"] for t in page.json()] == [1, 2]
+        assert page.headers["x-next-cursor"] == "2"
+
+
+def test_shared_mode_picks_up_other_process_writes(make_client, tmp_path):
+    client = make_client(TASKS_SHARED="1")
+    client.post("/tasks/", json={"id": 1, "title": "a", "completed": False})
+    assert client.get("/tasks/1").json()["title"] == "a"
+
+    # Another worker rewrites the file; the store reloads and bumps its version
+    (tmp_path / "tasks.json").write_text(json.dumps([{"id": 1, "title": "elsewhere", "completed": True}]))
+    deadline = time.monotonic() + 2
+    while client.get("/tasks/1").json()["title"] != "elsewhere":
+        assert time.monotonic() < deadline, "cached response outlived the other worker's write"
+        time.sleep(0.02)
+    assert client.get("/tasks/").json()[0]["title"] == "elsewhere"
+
+
+def test_after_id_without_limit_is_not_cached(make_client):
+    client = make_client()
+    for i in (1, 2, 3):
+        client.post("/tasks/", json={"id": i, "title": str(i), "completed": False})
+    main = sys.modules["main"]
+    for after_id in range(-50, 0):
+        assert len(client.get("/tasks/", params={"after_id": after_id}).json()) == 3
+    assert len(main._response_cache) == 0
+    assert [t["id"] for t in client.get("/tasks/", params={"after_id": 1}).json()] == [2, 3]
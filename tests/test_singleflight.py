@@ -0,0 +1,86 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_fetch():
+    async def run():
+        sf = SingleFlight()
+        fetches = 0
+
+        async def fetch(x):
+            nonlocal fetches
+            fetches += 1
+            await asyncio.sleep(0.01)
+            return x * 2
+
+        results = await asyncio.gather(*(sf.do("get", 1, fetch, 21) for _ in range(5)), sf.do("get", 2, fetch, 1))
+        assert results == [42] * 5 + [2]
+        assert fetches == 2
+        assert sf.calls == {"get": 6} and sf.fetches == {"get": 2}
+    asyncio.run(run())
+
+
+def test_next_call_after_completion_refetches():
+    async def run():
+        sf = SingleFlight()
+        values = iter([1, 2])
+
+        async def fetch():
+            return next(values)
+
+        assert await sf.do("get", 1, fetch) == 1
+        assert await sf.do("get", 1, fetch) == 2
+        assert sf.fetches["get"] == 2
+    asyncio.run(run())
+
+
+def test_exception_reaches_every_waiter():
+    async def run():
+        sf = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise LookupError("boom")
+
+        results = await asyncio.gather(*(sf.do("get", 1, fetch) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, LookupError) for r in results)
+        assert sf.fetches["get"] == 1
+        assert sf._inflight == {}
+    asyncio.run(run())
+
+
+def test_cancelled_caller_does_not_cancel_the_fetch():
+    async def run():
+        sf = SingleFlight()
+        gate = asyncio.Event()
+
+        async def fetch():
+            await gate.wait()
+            return "ok"
+
+        first = asyncio.create_task(sf.do("get", 1, fetch))
+        second = asyncio.create_task(sf.do("get", 1, fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        gate.set()
+        assert await second == "ok"
+        assert first.cancelled()
+        assert sf.fetches["get"] == 1
+    asyncio.run(run())
+
+
+def test_inflight_entry_from_another_loop_is_not_reused():
+    sf = SingleFlight()
+
+    async def fetch():
+        return "ok"
+
+    async def leave_pending():
+        # A fetch still pending when its event loop went away
+        sf._inflight[("get", 1)] = asyncio.get_running_loop().create_future()
+
+    asyncio.run(leave_pending())
+    assert asyncio.run(sf.do("get", 1, fetch)) == "ok"
+    assert sf.fetches["get"] == 1
@@ -0,0 +1,243 @@
+import json
+import pathlib
+import threading
+import time
+from concurrent.futures import wait
+
+import pytest
+from pydantic import BaseModel
+
+from task_store import FileTaskStore
+
+
+class Task(BaseModel):
+    id: int
+    title: str
+    completed: bool = False
+
+
+class Files:
+    """load/save callables over a JSON snapshot, counting saves."""
+
+    def __init__(self, path):
+        self.path = path
+        self.saves = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = False
+
+    def load(self):
+        if not self.path.exists():
+            return []
+        return [Task(**t) for t in json.loads(self.path.read_text())]
+
+    def save(self, items, sync):
+        self.gate.wait(5)
+        if self.fail:
+            raise OSError("disk full")
+        self.saves += 1
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps([t.model_dump() for t in items]))
+        tmp.replace(self.path)
+
+
+def _store(files, **kw):
+    return FileTaskStore(files.path, files.load, files.save, **kw)
+
+
+def test_concurrent_writes_share_one_flush(tmp_path):
+    files = Files(tmp_path / "tasks.json")
+    store = _store(files, flush_delay=0.2)
+    store.ensure_loaded()
+    barrier = threading.Barrier(8)
+    futures = [None] * 8
+
+    def writer(i):
+        barrier.wait()
+        futures[i] = store.create(Task(id=i, title=f"t{i}"))
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(f.result(timeout=5) is True for f in futures)
+    assert files.saves == 1
+    assert sorted(t["id"] for t in json.loads(files.path.read_text())) == list(range(8))
+
+
+def test_future_resolves_only_after_save(tmp_path):
+    files = Files(tmp_path / "tasks.json")
+    store = _store(files, flush_delay=0)
+    store.ensure_loaded()
+    files.gate.clear()
+    fut = store.create(Task(id=1, title="a"))
+    assert store.get(1).title == "a"  # visible to reads before it is durable
+    done, _ = wait([fut], timeout=0.1)
+    assert not done
+    files.gate.set()
+    assert fut.result(timeout=5) is True
+    assert json.loads(files.path.read_text())[0]["id"] == 1
+
+
+def test_rejected_ops_and_batch_flags(tmp_path):
+    files = Files(tmp_path / "tasks.json")
+    store = _store(files, flush_delay=0)
+    assert store.create(Task(id=1, title="a")).result(timeout=5)
+    assert store.create(Task(id=1, title="dup")) is None
+    assert store.update(Task(id=2, title="missing")) is None
+    assert store.delete(2) is None
+
+    oks, fut = store.apply_batch([
+        ("create", Task(id=2, title="b")),
+        ("create", Task(id=1, title="dup")),
+        ("update", Task(id=1, title="a2")),
+        ("delete", 3),
+    ])
+    assert oks == [True, False, True, False]
+    assert fut.result(timeout=5) == oks
+    assert store.apply_batch([("delete", 3)]) == ([False], None)
+    assert [t.title for t in store.list()] == ["a2", "b"]
+
+
+def test_failed_flush_rolls_back_and_fails_waiters(tmp_path):
+    files = Files(tmp_path / "tasks.json")
+    store = _store(files, flush_delay=0)
+    assert store.create(Task(id=1, title="a")).result(timeout=5)
+    assert store.create(Task(id=2, title="b")).result(timeout=5)
+
+    files.fail = True
+    files.gate.clear()
+    _, failed = store.apply_batch([
+        ("create", Task(id=3, title="c")),
+        ("update", Task(id=1, title="a2")),
+        ("delete", 2),
+    ])
+    time.sleep(0.05)  # the flusher is now blocked in save with the batch
+    behind = store.update(Task(id=3, title="c2"))  # depends on the failing create
+    files.gate.set()
+    for fut in (failed, behind):
+        with pytest.raises(OSError):
+            fut.result(timeout=5)
+    assert [(t.id, t.title) for t in store.list()] == [(1, "a"), (2, "b")]
+
+    # Nothing failed shows up later, and a client retry goes through
+    files.fail = False
+    assert store.create(Task(id=3, title="c")).result(timeout=5)
+    assert [(t["id"], t["title"]) for t in json.loads(files.path.read_text())] == [(1, "a"), (2, "b"), (3, "c")]
+
+
+@pytest.mark.parametrize("durability", ["none", "interval", "always"])
+def test_journal_replays_after_restart(tmp_path, durability):
+    files = Files(tmp_path / "tasks.json")
+    journal = tmp_path / "tasks.journal"
+    store = _store(files, flush_delay=0, journal=journal, model=Task, durability=durability, fsync_interval=0.05)
+    assert store.create(Task(id=1, title="a")).result(timeout=5)
+    assert store.create(Task(id=2, title="b")).result(timeout=5)
+    assert store.update(Task(id=1, title="a2", completed=True)).result(timeout=5)
+    assert store.delete(2).result(timeout=5)
+    assert files.saves == 0  # appends only, no snapshot rewrite
+
+    # A crash mid-append leaves a torn last line, which replay drops
+    with journal.open("ab") as f:
+        f.write(b'{"op":"put","task":{"id":3,"title":"c","completed":false}}')
+    reopened = _store(files, flush_delay=0, journal=journal, model=Task)
+    assert [(t.id, t.title, t.completed) for t in reopened.list()] == [(1, "a2", True)]
+    assert journal.read_bytes().endswith(b"\n")
+
+
+def test_failed_journal_append_leaves_no_partial_record(tmp_path, monkeypatch):
+    files = Files(tmp_path / "tasks.json")
+    journal = tmp_path / "tasks.journal"
+    store = _store(files, flush_delay=0, journal=journal, model=Task)
+    assert store.create(Task(id=1, title="a")).result(timeout=5)
+
+    real_open = pathlib.Path.open
+    torn = []
+
+    class Torn:
+        """Journal handle that writes part of the data and then runs out of space."""
+
+        def __init__(self, f):
+            self.f = f
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.f.close()
+
+        def write(self, data):
+            self.f.write(data[:15])
+            self.f.flush()
+            raise OSError(28, "No space left on device")
+
+    def fake_open(self, mode="r", *args, **kw):
+        f = real_open(self, mode, *args, **kw)
+        if self == journal and mode == "ab" and not torn:
+            torn.append(True)
+            return Torn(f)
+        return f
+
+    monkeypatch.setattr(pathlib.Path, "open", fake_open)
+    failed = store.create(Task(id=2, title="b"))
+    with pytest.raises(OSError):
+        failed.result(timeout=5)
+    assert torn
+    assert store.create(Task(id=3, title="c")).result(timeout=5)
+    assert store.create(Task(id=4, title="d")).result(timeout=5)
+
+    reopened = _store(files, flush_delay=0, journal=journal, model=Task)
+    assert [t.id for t in reopened.list()] == [1, 3, 4]
+
+
+def test_journal_compacts_into_snapshot(tmp_path):
+    files = Files(tmp_path / "tasks.json")
+    journal = tmp_path / "tasks.journal"
+    store = _store(files, flush_delay=0, journal=journal, model=Task, compact_bytes=200)
+    for i in range(10):
+        assert store.create(Task(id=i, title=f"t{i}")).result(timeout=5)
+    assert files.saves >= 1
+    assert journal.stat().st_size <= 200
+    reopened = _store(files, flush_delay=0, journal=journal, model=Task)
+    assert [t.id for t in reopened.list()] == list(range(10))
+
+
+def test_shared_mode_conflicting_creates_one_wins(tmp_path):
+    # Two processes' stores on the same files; both accept id 1 before
+    # either has flushed, and whichever flushes second must drop its op
+    a_files, b_files = Files(tmp_path / "tasks.json"), Files(tmp_path / "tasks.json")
+    a = _store(a_files, flush_delay=0.2, shared=True)
+    b = _store(b_files, flush_delay=0.2, shared=True)
+    fa = a.create(Task(id=1, title="from a"))
+    fb = b.create(Task(id=1, title="from b"))
+    assert sorted([fa.result(timeout=5), fb.result(timeout=5)]) == [False, True]
+    winner = "from a" if fa.result() else "from b"
+    assert [t["title"] for t in json.loads(a_files.path.read_text())] == [winner]
+    assert a.get(1).title == b.get(1).title == winner
+
+
+def test_shared_mode_write_sees_other_process_delete(tmp_path):
+    a_files, b_files = Files(tmp_path / "tasks.json"), Files(tmp_path / "tasks.json")
+    a = _store(a_files, flush_delay=0, shared=True)
+    b = _store(b_files, flush_delay=0, shared=True)
+    assert a.create(Task(id=1, title="x")).result(timeout=5)
+    assert b.update(Task(id=1, title="y")).result(timeout=5)
+    assert a.delete(1).result(timeout=5)
+    # b's copy still has id 1 until it rechecks under the flock
+    assert b.update(Task(id=1, title="z")) is None
+    assert json.loads(a_files.path.read_text()) == []
+
+
+def test_non_shared_mode_warns_before_overwriting_another_writer(tmp_path, capsys):
+    files = Files(tmp_path / "tasks.json")
+    store = _store(files, flush_delay=0)
+    assert store.create(Task(id=1, title="a")).result(timeout=5)
+    assert store.create(Task(id=2, title="b")).result(timeout=5)
+    assert "changed by another process" not in capsys.readouterr().err
+
+    files.path.write_text(json.dumps([{"id": 9, "title": "other worker", "completed": False}]))
+    assert store.create(Task(id=3, title="c")).result(timeout=5)
+    assert "changed by another process" in capsys.readouterr().err
+    assert store.create(Task(id=4, title="d")).result(timeout=5)
+    assert "changed by another process" not in capsys.readouterr().err
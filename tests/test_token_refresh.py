@@ -0,0 +1,115 @@
+"""
+Secrets Manager token refresh in logging_splunk, against a stubbed boto3.
+"""
+import importlib
+import json
+import sys
+import threading
+import time
+
+import pytest
+
+TTL = 0.3
+
+
+class FakeSecrets:
+    def __init__(self):
+        self.secret = "tok-a"
+        self.fetches = 0
+        self.fail = False
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def get_secret_value(self, SecretId):
+        assert SecretId == "arn:test"
+        self.fetches += 1
+        self.started.set()
+        self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("throttled")
+        return {"SecretString": json.dumps({"hec_token": self.secret})}
+
+
+class FakeBoto3:
+    def __init__(self):
+        self.clients = 0
+        self.secrets = FakeSecrets()
+
+    def client(self, name):
+        assert name == "secretsmanager"
+        self.clients += 1
+        return self.secrets
+
+
+@pytest.fixture
+def splunk(monkeypatch):
+    monkeypatch.delenv("SPLUNK_HEC_TOKEN", raising=False)
+    monkeypatch.delenv("SPLUNK_HEC_URL", raising=False)  # no shipper, no refresh at import
+    monkeypatch.setenv("SPLUNK_HEC_SECRET_ARN", "arn:test")
+    monkeypatch.setenv("SPLUNK_TOKEN_TTL_S", str(TTL))
+    sys.modules.pop("logging_splunk", None)
+    mod = importlib.import_module("logging_splunk")
+    fake = FakeBoto3()
+    monkeypatch.setattr(mod, "boto3", fake)
+    yield mod, fake
+    sys.modules.pop("logging_splunk", None)
+
+
+def _wait_for(pred, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not pred():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_first_call_waits_for_fetch_then_uses_cache(splunk):
+    mod, fake = splunk
+    assert mod._get_token() == "tok-a"
+    assert mod._get_token() == "tok-a"
+    assert fake.secrets.fetches == 1
+
+
+def test_rotated_secret_picked_up_within_ttl(splunk):
+    mod, fake = splunk
+    assert mod._get_token() == "tok-a"
+    fake.secrets.secret = "tok-b"
+    rotated = time.monotonic()
+    assert _wait_for(lambda: mod._get_token() == "tok-b", timeout=TTL + 1.0)
+    assert time.monotonic() - rotated <= TTL + 1.0
+    assert fake.secrets.fetches == 2
+    assert fake.clients == 1
+
+
+def test_old_token_served_while_refresh_in_flight(splunk):
+    mod, fake = splunk
+    assert mod._get_token() == "tok-a"
+    fake.secrets.secret = "tok-b"
+    fake.secrets.started.clear()
+    fake.secrets.gate.clear()
+    mod._next_refresh_ts = float("-inf")
+
+    t0 = time.monotonic()
+    assert mod._get_token() == "tok-a"
+    assert fake.secrets.started.wait(2)
+    assert mod._get_token() == "tok-a"
+    assert time.monotonic() - t0 < 1.0  # nobody waited on the blocked fetch
+    assert fake.secrets.fetches == 2  # one refresh in flight, not one per call
+
+    fake.secrets.gate.set()
+    assert _wait_for(lambda: mod._get_token() == "tok-b")
+    assert fake.clients == 1
+
+
+def test_failed_refresh_keeps_previous_token(splunk):
+    mod, fake = splunk
+    assert mod._get_token() == "tok-a"
+    fake.secrets.fail = True
+    mod._next_refresh_ts = float("-inf")
+    assert mod._get_token() == "tok-a"
+    assert _wait_for(lambda: not mod._refreshing and mod._next_refresh_ts > time.monotonic())
+    assert mod._get_token() == "tok-a"
+    assert fake.secrets.fetches == 2
+    assert fake.clients == 1